@@ -2,29 +2,82 @@ import sys
 import numpy as np
 import pandas as pd
 import matplotlib as mpl
-import matplotlib.pyplot as plt
+import matplotlib.lines
+import matplotlib.collections
 from matplotlib import rc_context
 
 
-cc = plt.rcParams['axes.prop_cycle'].by_key()['color']
+cc = mpl.rcParams['axes.prop_cycle'].by_key()['color']
 _TeX_size_dic = {'pt':72.27, 'mm':25.4, 'cm':2.54, 'ex':16.78534,
                  'em':7.22699, 'bp':72, 'dd':67.54151, 'pc':6.02250}
 
+def dates_to_x(ax, dates):
+    """
+    Description:
+        Converts dates to x values in the units of the axis, e.g., periods
+        of a pandas plot of a regular time series. An axis without units
+        is set to pandas' date units, like pandas' own plots.
+
+    Arguments:
+        ax: axis for plotting
+        dates: pandas DatetimeIndex or datetime series
+
+    Returns:
+        Numpy array of x values
+    """
+    dates = pd.DatetimeIndex(dates)
+    if ax.xaxis.get_converter() is None:
+        option = pd.get_option('plotting.matplotlib.register_converters')
+        if option:
+            pd.plotting.register_matplotlib_converters()
+        try:
+            ax.xaxis.update_units(dates)
+        finally:
+            if option == 'auto':
+                pd.plotting.deregister_matplotlib_converters()
+    return np.asarray(ax.xaxis.convert_units(dates), dtype=float)
+
+
 def candlestick(ax, df, dt, c_bear='r', c_bull='g'):
-    color = np.where(df.close > df.open, c_bull, c_bear)
-    for r in range(len(df)):
-        if r < len(df)-1:
-            x1, x3 = df.index[r], df.index[r+1]
-        else:
-            x1, x3 = df.index[-1], df.index[-1]+dt
-        x2 = pd.DatetimeIndex([x1, x3]).mean()
-        ax.plot([x2, x2], [df.low[r], df.high[r]],
-                  lw=1.5, c='black', solid_capstyle='round', zorder=1)
-        rect = mpl.patches.Rectangle((x1, df.open[r]), x3-x1,
-                                     (df.close[r]-df.open[r]),
-                                     facecolor=color[r], edgecolor='black',
-                                     lw=1.5, zorder=2)
-        ax.add_patch(rect)
+    """
+    Arguments:
+        ax: axis for plotting
+        df: dataframe of bars with open, close, low, and high
+        dt: timedelta of last bar
+
+    Keyword arguments:
+        c_bear: body color of bars closing below open (default: r)
+        c_bull: body color of bars closing above open (default: g)
+
+    Notes:
+        ^wicks are drawn as a single line broken between bars, and bodies
+         as a single collection, so rendering time barely grows with the
+         number of bars
+        ^x values are in the axis' units (see dates_to_x), so candles
+         line up with pandas plots drawn before or after them
+    """
+    if not len(df):
+        return
+    # Bodies span from bar's time to next bar's time, wicks at the middle
+    x = dates_to_x(ax, df.index.append(df.index[-1:]+dt))
+    x1, x3 = x[:-1], x[1:]
+    x2 = (x1+x3)/2
+    o, c = df.open.to_numpy(float), df.close.to_numpy(float)
+    l, h = df.low.to_numpy(float), df.high.to_numpy(float)
+    color = np.where(c > o, c_bull, c_bear)
+    # A line (rather than a collection) also keeps pandas plotting later
+    # series on this axis' dates instead of switching it to periods
+    gap = np.full(len(df), np.nan)
+    ax.add_line(mpl.lines.Line2D(
+        np.column_stack([x2, x2, gap]).ravel(),
+        np.column_stack([l, h, gap]).ravel(),
+        lw=1.5, color='black', solid_capstyle='round', zorder=1))
+    bodies = np.stack([np.column_stack([x1, o]), np.column_stack([x3, o]),
+                       np.column_stack([x3, c]), np.column_stack([x1, c])],
+                      axis=1)
+    ax.add_collection(mpl.collections.PolyCollection(
+        bodies, facecolors=color, edgecolors='black', lw=1.5, zorder=2))
+    ax.autoscale_view()
     return
 
 
@@ -91,4 +144,21 @@ _rcParams = {
     'xtick.color':_color1,
     'ytick.color':_color1,
 }
-mpl.rcParams.update(_rcParams)
\ No newline at end of file
+
+
+def use_style():
+    """
+    Description:
+        Applies the package's plot style to matplotlib's global rcParams,
+        use style() to apply it only within a block.
+    """
+    mpl.rcParams.update(_rcParams)
+    return
+
+
+def style():
+    """
+    Returns:
+        context manager applying the package's plot style within a block
+    """
+    return rc_context(_rcParams)
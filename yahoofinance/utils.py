@@ -1,13 +1,12 @@
-import locale
-import calendar
 import numpy as np
+import pandas as pd
 from pytz import timezone as pytz
 from datetime import datetime, timedelta
 
+from yf_calendar import exchange_calendar
+
 
-locale.setlocale(locale.LC_ALL, '')
 _unix_epoch = datetime(1970, 1, 1, tzinfo=pytz('UTC'))
-_business_calender = calendar.Calendar(firstweekday=calendar.MONDAY)
 
 
 def UT_to_str(time, timezone='UTC', fmt='%Y-%m-%d %H:%M:%S %Z',
@@ -61,35 +60,85 @@ def str_to_UT(time, timezone='UTC', fmt='%Y-%m-%d %H:%M:%S',
 
 
 
-def UT_to_FTDM_UT(time, timezone='UTC', epoch=_unix_epoch):
+def UT_to_DTI(time, timezone='UTC', tz='naive', normalize=False,
+              epoch=_unix_epoch):
+    """
+    Arguments:
+        time: array of times in seconds since epoch
+
+    Keyword arguments:
+        timezone: one of the pytz timezones (default: UTC)
+        tz: 'naive' for timezone naive wall times of timezone, 'local' for
+            timezone aware times in timezone, or 'UTC' for UTC times
+            (default: naive)
+        normalize: truncate times to midnight of timezone (boolean)
+        epoch: when t=0 (default: unix, 1970-01-01 00:00:00 UTC)
+
+    Example:
+        UT_to_DTI([345459600, 1577865600], timezone='America/New_York')
+
+    Returns:
+        pandas DatetimeIndex of times
+    """
+    index = pd.to_datetime(np.asarray(time, dtype=np.int64), unit='s',
+                           utc=True)
+    index += pd.Timestamp(epoch)-pd.Timestamp(_unix_epoch)
+    index = index.tz_convert(timezone)
+    if normalize:
+        index = index.normalize()
+    if tz == 'naive':
+        return index.tz_localize(None)
+    elif tz == 'UTC':
+        return index.tz_convert('UTC')
+    return index
+
+
+def DTI_to_UT(index, timezone='UTC', epoch=_unix_epoch):
+    """
+    Arguments:
+        index: pandas DatetimeIndex
+
+    Keyword arguments:
+        timezone: timezone of index if index is timezone naive (default: UTC)
+        epoch: when t=0 (default: unix, 1970-01-01 00:00:00 UTC)
+
+    Example:
+        DTI_to_UT(data.index, timezone='America/New_York')
+
+    Returns:
+        Numpy array of integer seconds since epoch
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        # Ambiguous wall times (DST fall back) are taken as standard time
+        index = index.tz_localize(timezone,
+                                  ambiguous=np.zeros(len(index), dtype=bool),
+                                  nonexistent='shift_forward')
+    seconds = (index-pd.Timestamp(epoch))/pd.Timedelta(1, unit='s')
+    return np.asarray(seconds, dtype=float).astype(np.int64)
+
+
+def UT_to_FTDM_UT(time, timezone='UTC', epoch=_unix_epoch,
+                  exchange='NYSE'):
     """
     Description:
         Calculates the seconds since epoch of the first trading day of the
-        month (FTDM), taking into account the New Years Days trading holiday
-        
+        month (FTDM), taking into account the exchange's holidays
+
     Arguments:
-        time: seconds since epoch (in seconds)
-        
+        time: seconds since epoch (in seconds), or array of them
+
     Keyword arguments:
-        timezone:
-        epoch:
-        
+        timezone: one of the pytz timezones (default: UTC)
+        epoch: when t=0 (default: unix, 1970-01-01 00:00:00 UTC)
+        exchange: trading calendar used, see exchange_calendar
+
     Returns:
-        Time since epoch of first trading day of the month
+        Time since epoch of first trading day of the month (array of them
+        if time is an array)
     """
-    year, month = list(map(int, UT_to_str(time, fmt='%Y %m',
-                                          timezone=timezone, epoch=epoch)
-                                .split()))
-    cal = _business_calender.monthdayscalendar(year, month)
-    # Sum days in first business week, in general three cases exist for FTM
-    week1_sum = np.sum(cal[0])
-    FTDM = 3 if (week1_sum == 3) else 2 if (week1_sum == 1) else 1
-    # Account for New Years Day
-    if FTDM == 1 and month == 1:
-        # Special case when 01-01 falls on a Friday, FTM is 4
-        if week1_sum == 6:
-            FTDM = 4
-        else:
-            FTDM += 1
-    return (pytz(timezone).localize(datetime(year, month, FTDM))
-            -epoch).total_seconds()
\ No newline at end of file
+    dates = UT_to_DTI(np.atleast_1d(time), timezone=timezone, epoch=epoch)
+    years = (dates.year.min(), dates.year.max()) if len(dates) else None
+    FTDM = exchange_calendar(exchange, years).first_of_month(dates)
+    FTDM = DTI_to_UT(FTDM, timezone=timezone, epoch=epoch).astype(float)
+    return FTDM if np.ndim(time) else FTDM[0]
@@ -0,0 +1,199 @@
+"""
+yf_backtest.py
+    Contains backtest, a vectorized backtester turning signal columns
+    (e.g., from price_data indicators) into positions, trades, and equity
+    curves of many symbols and parameter sets at once, and helpers to
+    build crossover signals over sweeps of spans.
+"""
+import numpy as np
+import pandas as pd
+
+from yf_rolling import rolling_mean
+
+
+def matrix(prices, var='close'):
+    """
+    Arguments:
+        prices: price_data object
+
+    Keyword arguments:
+        var: variable of price data, e.g., 'close' or 'MACD_sig'
+
+    Returns:
+        (bars x symbols) dataframe of var, whatever prices' layout
+    """
+    if not prices.multiple:
+        return prices.data[[var]].set_axis([prices.symbols], axis=1)
+    return pd.concat({sym: df[var] for sym, df in
+                      prices._frames(prices.data)}, axis=1).sort_index()
+
+
+def crossover(fast, slow, short=False):
+    """
+    Returns:
+        signals, long (1) where fast is above slow, and otherwise short
+        (-1) if short or flat (0); NaN until both are defined
+    """
+    signal = np.sign(fast-slow)
+    if not short:
+        signal = np.maximum(signal, 0)
+    return signal
+
+
+def sweep(close, fast, slow, kind='EMA', short=False):
+    """
+    Description:
+        Crossover signals of every symbol and every (fast, slow) pair of
+        spans (or windows) with fast < slow. Each average is calculated
+        once for all symbols, the pairs are then differenced as arrays.
+
+    Arguments:
+        close: (bars x symbols) dataframe of prices, see matrix
+        fast: list of spans (or windows) of the fast average
+        slow: list of spans (or windows) of the slow average
+
+    Keyword arguments:
+        kind: 'EMA' or 'MA' (simple moving average)
+        short: go short when fast is below slow (boolean)
+
+    Notes:
+        ^result has bars x symbols x pairs values, mind memory
+
+    Returns:
+        dataframe of signals with (symbol, fast, slow) columns
+    """
+    pairs = [(f, s) for f in fast for s in slow if f < s]
+    spans = sorted({x for pair in pairs for x in pair})
+    if kind == 'EMA':
+        # Like price_data's EMA, bars a symbol is missing don't decay it
+        average = lambda n: close.ewm(span=n, ignore_na=True).mean()
+    elif kind == 'MA':
+        average = lambda n: rolling_mean(close, n)
+    else:
+        raise ValueError('kind must be EMA or MA')
+    averages = np.stack([average(n).to_numpy(dtype=np.float64)
+                         for n in spans])
+    index = {n: i for i, n in enumerate(spans)}
+    f = [index[pair[0]] for pair in pairs]
+    s = [index[pair[1]] for pair in pairs]
+    # (pairs x bars x symbols) to bars x (symbols x pairs)
+    signal = crossover(averages[f], averages[s], short=short)
+    signal = signal.transpose(1, 2, 0).reshape(len(close), -1)
+    columns = pd.MultiIndex.from_tuples(
+        [(sym,)+pair for sym in close.columns for pair in pairs],
+        names=['symbol', 'fast', 'slow'])
+    return pd.DataFrame(signal, index=close.index, columns=columns)
+
+
+class backtest:
+    """
+    Backtest
+        Vectorized backtest of signals (target positions, e.g., 1 long,
+        0 flat, -1 short, fractions scale) against prices. The position
+        taken on a bar's signal is held from that bar's close, so it
+        earns the next bar's return, avoiding look-ahead. Commission and
+        slippage are charged as fractions of the value traded.
+
+    Example:
+        close = matrix(prices)
+        bt = backtest(close, sweep(close, [5, 10], [20, 50]),
+                      commission=0.0005, slippage=0.0005)
+        bt.summary()
+    """
+
+    def __init__(self, close, signal, commission=0., slippage=0.,
+                 cash=1.):
+        """
+        Arguments:
+            close: (bars x symbols) dataframe of prices
+            signal: dataframe of target positions, with symbol columns or
+                    (symbol, parameters...) columns of a sweep; NaN holds
+                    the previous position
+
+        Keyword arguments:
+            commission: fraction of value traded paid as commission
+            slippage: fraction of value traded lost to slippage
+            cash: starting equity of each column
+        """
+        if isinstance(close, pd.Series):
+            close = close.to_frame()
+        if isinstance(signal, pd.Series):
+            signal = signal.to_frame()
+        signal = signal.reindex(close.index)
+        symbols = signal.columns
+        if isinstance(symbols, pd.MultiIndex):
+            # Parameter sets of a sweep share their symbol's prices
+            symbols = symbols.get_level_values(0)
+        close = close[symbols.unique()]
+        self.commission = commission
+        self.slippage = slippage
+        self.cash = cash
+        # Returns of each symbol once, then indexed by each column's
+        # symbol; prices carried over bars a symbol is missing earn nothing
+        price = close.ffill().to_numpy(dtype=np.float64)
+        change = np.zeros_like(price)
+        change[1:] = price[1:]/price[:-1]-1
+        change[~np.isfinite(change)] = 0.
+        self._symbol = close.columns.get_indexer(symbols)
+        target = signal.to_numpy(dtype=np.float64)
+        position = np.zeros_like(target)
+        position[1:] = pd.DataFrame(target[:-1]).ffill().fillna(0).to_numpy()
+        turnover = np.abs(np.diff(position, axis=0, prepend=0.))
+        returns = position*change[:, self._symbol]
+        returns -= turnover*(commission+slippage)
+        self._price = price
+        index, columns = close.index, signal.columns
+        frame = lambda x: pd.DataFrame(x, index=index, columns=columns)
+        self.positions = frame(position)
+        self.returns = frame(returns)
+        self.equity = frame(cash*np.cumprod(1+returns, axis=0))
+        self._turnover = turnover
+        return
+
+
+    @property
+    def trades(self):
+        """
+        Returns:
+            dataframe of trades (time, column, size, position after, and
+            price paid including slippage), one row per position change
+        """
+        i, j = np.nonzero(self._turnover)
+        position = self.positions.to_numpy()
+        size = position[i, j]-np.where(i > 0, position[i-1, j], 0.)
+        # Positions change at the close of the bar before they're held
+        bar = np.maximum(i-1, 0)
+        price = self._price[bar, self._symbol[j]]
+        price = price*(1+np.sign(size)*self.slippage)
+        columns = self.positions.columns
+        return pd.DataFrame({'time': self.positions.index[bar],
+                             'column': columns[j] if not isinstance(
+                                 columns, pd.MultiIndex) else
+                                 list(columns[j]),
+                             'size': size, 'position': position[i, j],
+                             'price': price})
+
+
+    def summary(self, periods_per_year=252):
+        """
+        Keyword arguments:
+            periods_per_year: bars in a year, e.g., 252 for daily bars
+
+        Returns:
+            dataframe of total return, annualized Sharpe ratio, maximum
+            drawdown, number of trades, and exposure (fraction of bars in
+            a position) of each column
+        """
+        equity = self.equity.to_numpy()
+        returns = self.returns.to_numpy()
+        std = returns.std(axis=0)
+        sharpe = np.divide(returns.mean(axis=0), std,
+                           out=np.full(std.shape, np.nan), where=std > 0)
+        drawdown = equity/np.maximum.accumulate(equity, axis=0)-1
+        return pd.DataFrame({
+            'total_return': equity[-1]/self.cash-1,
+            'sharpe': sharpe*np.sqrt(periods_per_year),
+            'max_drawdown': drawdown.min(axis=0),
+            'trades': (self._turnover > 0).sum(axis=0),
+            'exposure': (self.positions.to_numpy() != 0).mean(axis=0)
+        }, index=self.positions.columns)
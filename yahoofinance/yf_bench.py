@@ -0,0 +1,164 @@
+"""
+yf_bench.py
+    Offline benchmark of the fetch pipeline, price_data indicators, and
+    plotting, against a local stand-in of the Yahoo Finance API (see
+    yf_standin.py). Needs no network access.
+
+Example:
+    python yf_bench.py --symbols 1 100 --bars 100 10000 --workers 8
+"""
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+
+from yf_fetcher import yf_fetcher
+from yf_price import price_data
+from yf_stats import yf_stats
+from yf_standin import standin_server, chart_payload
+
+
+_period1 = 1262304000 # 2010-01-01 00:00:00 UTC
+
+
+def timed(func, *args, **kwargs):
+    """
+    Returns:
+        tuple of seconds taken by func(*args, **kwargs), and its result
+    """
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter()-t0, result
+
+
+class benchmark:
+    """
+    Benchmark
+        Times each stage for every combination of number of symbols and
+        number of bars, collecting rows of (stage, symbols, bars, seconds).
+    """
+
+    _indicators = [('OBV', (), {}), ('MA', (20,), {}), ('EMA', (20,), {}),
+                   ('MACD', (), {}), ('ROI', (), {}), ('RC', (), {}),
+                   ('pivot_points', (), {'resample': True})]
+
+    def __init__(self, server, interval='1m', workers=8, panel=False,
+                 plot=True, stats=False):
+        """
+        Arguments:
+            server: running standin_server
+
+        Keyword arguments:
+            interval: one of YF's data intervals, e.g., '1d'
+            workers: symbols fetched concurrently
+            panel: benchmark indicators on a panel (boolean)
+            plot: benchmark plotting (boolean)
+            stats: record the fetcher's per-stage yf_stats (boolean)
+        """
+        self.server = server
+        self.interval = interval
+        self.workers = workers
+        self.panel = panel
+        self.plot = plot
+        self.stats = yf_stats() if stats else None
+        # Fundamentals aren't cached, so every run times their requests
+        self.fetcher = yf_fetcher(workers=workers, yahoo_url=server.url,
+                                  stats=self.stats,
+                                  module_ttl={m: 0 for m in
+                                              yf_fetcher._valid_modules})
+        self.rows = []
+        return
+
+
+    def record(self, stage, nsymbols, nbars, seconds):
+        self.rows.append((stage, nsymbols, nbars, seconds))
+        print('{:<24s} {:>8d} {:>10d} {:>12.4f}'
+              .format(stage, nsymbols, nbars, seconds))
+        sys.stdout.flush()
+        return
+
+
+    def run(self, nsymbols, nbars):
+        symbols = ['S{:05d}'.format(i) for i in range(nsymbols)]
+        step = self.fetcher._seconds_in_interval[self.interval]
+        # Extra bar since subday fetches drop the last (live) bar
+        period2 = _period1+(nbars+1)*step
+        payload = chart_payload(symbols[0], _period1, period2, self.interval)
+        # Warm stand-in so payload generation isn't timed as fetching
+        self.fetcher.fetch_price_history(symbols, _period1, period2,
+                                         self.interval)
+        seconds, (meta, data) = timed(self.fetcher.fetch_price_history,
+                                      symbols, _period1, period2,
+                                      self.interval)
+        self.record('fetch', nsymbols, nbars, seconds)
+        response = SimpleNamespace(content=payload)
+        seconds, decoded = timed(lambda: [self.fetcher._json(response)
+                                          for s in symbols])
+        self.record('decode', nsymbols, nbars, seconds)
+        seconds, frames = timed(lambda: [self.fetcher._parse_chart(
+            s, decoded[0], _period1, period2, self.interval)
+            for s in symbols])
+        self.record('frame', nsymbols, nbars, seconds)
+        seconds, funds = timed(self.fetcher.fetch_fundamentals_bulk,
+                               symbols, ['price', 'summaryDetail'])
+        self.record('fundamentals', nsymbols, nbars, seconds)
+        seconds, prices = timed(price_data, symbols, _period1, period2,
+                                self.interval, fetcher=self.fetcher,
+                                panel=self.panel)
+        self.record('price_data', nsymbols, nbars, seconds)
+        for name, args, kwargs in self._indicators:
+            seconds, result = timed(getattr(prices, name), *args, **kwargs)
+            self.record(name, nsymbols, nbars, seconds)
+        if self.plot:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            for var, kwargs in [('close', {}), ('candle', {}),
+                                ('close', {'npivots': 3})]:
+                fig, ax = plt.subplots()
+                def draw():
+                    prices.plot(fig, ax, var, **kwargs)
+                    fig.canvas.draw()
+                seconds, result = timed(draw)
+                plt.close(fig)
+                name = 'plot_'+var+('_pivots' if kwargs else '')
+                self.record(name, nsymbols, nbars, seconds)
+        return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1, 10],
+                        help='numbers of symbols benchmarked')
+    parser.add_argument('--bars', type=int, nargs='+', default=[100, 10000],
+                        help='numbers of bars per symbol benchmarked')
+    parser.add_argument('--interval', default='1m', help='bar interval')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='symbols fetched concurrently')
+    parser.add_argument('--panel', action='store_true',
+                        help='store multiple symbols as a panel')
+    parser.add_argument('--no-plot', action='store_true',
+                        help='skip plotting benchmarks')
+    parser.add_argument('--stats', action='store_true',
+                        help='print per-stage timings and counters')
+    parser.add_argument('--replay', default=None,
+                        help='directory of recorded payloads to serve')
+    args = parser.parse_args(argv)
+    with standin_server(replay=args.replay) as server:
+        bench = benchmark(server, interval=args.interval,
+                          workers=args.workers, panel=args.panel,
+                          plot=not args.no_plot, stats=args.stats)
+        print('{:<24s} {:>8s} {:>10s} {:>12s}'
+              .format('stage', 'symbols', 'bars', 'seconds'))
+        for nsymbols in args.symbols:
+            for nbars in args.bars:
+                bench.run(nsymbols, nbars)
+    if bench.stats is not None:
+        print(bench.stats.summary().to_string())
+        print(bench.stats.counts().to_string())
+    return bench.rows
+
+
+if __name__ == '__main__':
+    main()
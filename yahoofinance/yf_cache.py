@@ -0,0 +1,298 @@
+"""
+yf_cache.py
+    Contains price_cache, an on-disk store of the price history already
+    fetched from Yahoo Finance. Only the time ranges missing from the
+    store are requested from the API, and merged into the stored bars.
+"""
+
+import os
+import time
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+
+from utils import *
+
+
+class price_cache:
+    """
+    Price Cache
+        Stores bars per (symbol, interval, PrePost, events) key, along
+        with the time ranges (seconds since epoch) those bars cover.
+    """
+
+    def __init__(self, path=None):
+        """
+        Keyword arguments:
+            path: directory of cache files (default: ~/.cache/yahoofinance)
+        """
+        if path is None:
+            path = os.path.join('~', '.cache', 'yahoofinance')
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        return
+
+
+    def __getstate__(self):
+        # Locks can't be pickled, e.g., to pass a cache to worker processes
+        state = dict(self.__dict__)
+        del state['_locks'], state['_locks_lock']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        return
+
+
+    def key(self, symbol, interval, PrePost=False, div=False, split=False):
+        events = ','.join([e for e, b in [('div', div), ('split', split)]
+                           if b])
+        return (symbol, interval, bool(PrePost), events)
+
+
+    def _file(self, key):
+        symbol, interval, PrePost, events = key
+        name = '{:s}_{:s}_{:d}_{:s}.pkl'.format(symbol, interval, PrePost,
+                                                events.replace(',', '-'))
+        return os.path.join(self.path, name.replace(os.sep, '-'))
+
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+    def load(self, key):
+        """
+        Returns:
+            dict of meta, data, and coverage for key (None if not cached)
+        """
+        try:
+            with open(self._file(key), 'rb') as file:
+                return pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+
+    def save(self, key, entry):
+        # Write to temporary file first so readers never see partial files
+        fname = self._file(key)
+        tmp = '{:s}.{:d}.{:d}.tmp'.format(fname, os.getpid(),
+                                          threading.get_ident())
+        with open(tmp, 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)
+        return
+
+
+    @staticmethod
+    def _to_utc(data, meta):
+        """
+        Returns:
+            data indexed by UTC times, whatever index_tz it was fetched
+            with
+        """
+        index = data.index
+        if index.tz is None:
+            # Ambiguous wall times (DST fall back) are taken as standard time
+            index = index.tz_localize(meta['exchangeTimezoneName'],
+                                      ambiguous=np.zeros(len(index),
+                                                         dtype=bool),
+                                      nonexistent='shift_forward')
+        return data.set_axis(index.tz_convert('UTC'), axis=0)
+
+
+    @staticmethod
+    def _to_index_tz(data, meta, index_tz):
+        """
+        Returns:
+            data indexed by UTC times reindexed in index_tz, see yf_fetcher
+        """
+        if index_tz == 'UTC':
+            return data
+        index = data.index.tz_convert(meta['exchangeTimezoneName'])
+        if index_tz == 'naive':
+            index = index.tz_localize(None)
+        return data.set_axis(index, axis=0)
+
+
+    @staticmethod
+    def _ends(index, meta, seconds):
+        """
+        Returns:
+            array of ends (seconds since epoch) of bars starting at index
+            (UTC), seconds later in exchange wall time, so daily bars
+            end at the next midnight across DST changes
+        """
+        timezone = meta['exchangeTimezoneName']
+        wall = index.tz_convert(timezone).tz_localize(None)
+        return DTI_to_UT(wall+pd.Timedelta(seconds, unit='s'),
+                         timezone=timezone)
+
+
+    def _data(self, entry):
+        """
+        Returns:
+            dataframe of all bars of entry indexed by UTC times (None if
+            it has none)
+        """
+        if entry['data'] is None:
+            return None
+        return self._to_utc(entry['data'], entry['meta'])
+
+
+    def _slice(self, fetcher, entry, period1, period2, interval):
+        """
+        Returns:
+            tuple of meta data, and dataframe of entry's bars overlapping
+            period1 to period2 (like a request of the range returns),
+            indexed in fetcher's index_tz and cast to its dtypes
+        """
+        meta, data = entry['meta'], self._data(entry)
+        if data is None:
+            return None, None
+        t = DTI_to_UT(data.index)
+        end = self._ends(data.index, meta,
+                         fetcher._seconds_in_interval[interval])
+        data = data[(end > period1) & (t < period2)].copy()
+        data = self._to_index_tz(data, meta, fetcher.index_tz)
+        return meta, fetcher._cast(data)
+
+
+    def clear(self, symbol=None):
+        """
+        Description:
+            Removes cache files of a symbol, or all cache files.
+        """
+        for fname in os.listdir(self.path):
+            if (fname.endswith('.pkl') and
+                (symbol is None or fname.startswith(symbol+'_'))):
+                os.remove(os.path.join(self.path, fname))
+        return
+
+
+    @staticmethod
+    def missing(coverage, period1, period2):
+        """
+        Arguments:
+            coverage: sorted list of disjoint [start, end] ranges
+            period1: start of requested range
+            period2: end of requested range
+
+        Returns:
+            list of (start, end) ranges of request not covered
+        """
+        gaps = []
+        start = period1
+        for c1, c2 in coverage:
+            if c2 <= start:
+                continue
+            if c1 >= period2:
+                break
+            if c1 > start:
+                gaps.append((start, c1))
+            start = max(start, c2)
+        if start < period2:
+            gaps.append((start, period2))
+        return gaps
+
+
+    @staticmethod
+    def merge(coverage):
+        """
+        Returns:
+            sorted list of disjoint ranges covering the same time as coverage
+        """
+        merged = []
+        for c1, c2 in sorted(coverage):
+            if merged and c1 <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], c2)
+            else:
+                merged.append([c1, c2])
+        return merged
+
+
+    def fetch(self, fetcher, symbol, period1, period2, interval,
+              PrePost=False, div=False, split=False):
+        """
+        Description:
+            Fetches the price history of a single symbol, only requesting
+            the parts of period1 to period2 not already in the cache.
+
+        Arguments:
+            fetcher: yf_fetcher used to request missing ranges
+            symbol: stock ticker to fetch prices of
+            period1: first date to fetch prices
+            period2: last date to fetch prices
+            interval: one of YF's data intervals, e.g., '1d'
+
+        Keyword arguments:
+            PrePost: include pre and post market data (boolean)
+            div: include dividend data (boolean)
+            split: include split data (boolean)
+
+        Notes:
+            ^bars newer than one interval ago are not marked as covered,
+             so the live (incomplete) bar is fetched again next time
+
+        Returns:
+            tuple of meta data, and pandas dataframe of prices
+        """
+        key = self.key(symbol, interval, PrePost, div, split)
+        seconds = fetcher._seconds_in_interval.get(interval)
+        if seconds is None:
+            return fetcher._fetch_price_history(symbol, period1, period2,
+                                                interval, PrePost=PrePost,
+                                                div=div, split=split)
+        with self._lock(key):
+            entry = self.load(key)
+            if entry is None:
+                entry = {'meta': None, 'data': None, 'coverage': []}
+            frames = []
+            coverage = list(entry['coverage'])
+            fetched = False
+            requested = False
+            for p1, p2 in self.missing(entry['coverage'], period1, period2):
+                # Gaps shorter than an interval cannot hold a new bar
+                if p2-p1 < seconds:
+                    continue
+                requested = True
+                fetcher._count('cache_misses')
+                # Stored at full precision, each reader casts to its dtypes
+                meta, data = fetcher._fetch_price_history(
+                    symbol, p1, p2, interval, PrePost=PrePost, div=div,
+                    split=split, dtypes=fetcher._dtype_policies['default']
+                )
+                if meta is None and data is None:
+                    continue
+                fetched = True
+                entry['meta'] = meta
+                end = min(p2, int(time.time())-seconds)
+                if (interval in fetcher._valid_subday_intervals and
+                    len(data)):
+                    # Last bar of subday requests is dropped by the fetcher
+                    last = DTI_to_UT(data.index[-1:],
+                                     timezone=meta['exchangeTimezoneName'])
+                    end = min(end, int(last[0])+seconds)
+                if end > p1:
+                    coverage.append([p1, end])
+                # Stored in UTC, so fetchers of any index_tz share entries
+                frames.append(self._to_utc(data, meta))
+            if not requested:
+                fetcher._count('cache_hits')
+            if fetched:
+                stored = self._data(entry)
+                if stored is not None:
+                    frames.insert(0, stored)
+                data = pd.concat(frames)
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+                entry['data'] = data
+                entry['coverage'] = self.merge(coverage)
+                self.save(key, entry)
+        return self._slice(fetcher, entry, period1, period2, interval)
@@ -0,0 +1,372 @@
+"""
+yf_calendar.py
+    Contains trading_calendar, a precomputed table of an exchange's
+    trading sessions (holidays and early closes included) with vectorized
+    lookups over arrays of dates, e.g., the first trading day of the
+    month of every bar.
+"""
+import functools
+import numpy as np
+import pandas as pd
+
+
+# Days unscheduled closures of NYSE (national mourning, weather, 9/11)
+_nyse_closures = ['1985-09-27', '1994-04-27', '2001-09-11', '2001-09-12',
+                  '2001-09-13', '2001-09-14', '2004-06-11', '2007-01-02',
+                  '2012-10-29', '2012-10-30', '2018-12-05', '2025-01-09']
+
+# YF exchangeName codes of US exchanges trading on NYSE's calendar
+_us_exchanges = ['NYQ', 'NMS', 'NGM', 'NCM', 'NAS', 'ASE', 'PCX', 'BTS',
+                 'PNK', 'NIM', 'OPR', 'CBO', 'WCB', 'SNP', 'DJI']
+
+
+def _easter(years):
+    """
+    Returns:
+        array of (month, day) of Easter Sunday in Gregorian years
+    """
+    y = np.asarray(years)
+    a, b, c = y % 19, y//100, y % 100
+    d, e = b//4, b % 4
+    g = (8*b+13)//25
+    h = (19*a+b-d-g+15) % 30
+    i, k = c//4, c % 4
+    l = (32+2*e+2*i-h-k) % 7
+    m = (a+11*h+19*l)//433
+    month = (h+l-7*m+90)//25
+    day = (h+l-7*m+33*month+19) % 32
+    return month, day
+
+
+def _nth_weekday(years, month, weekday, n):
+    """
+    Returns:
+        DatetimeIndex of the nth (negative from end) weekday (Monday = 0)
+        of month in each year
+    """
+    if n > 0:
+        first = pd.to_datetime({'year': years, 'month': month, 'day': 1})
+        shift = (weekday-first.dt.weekday) % 7+7*(n-1)
+    else:
+        first = (pd.to_datetime({'year': years, 'month': month, 'day': 1})
+                 +pd.offsets.MonthEnd(0))
+        shift = -((first.dt.weekday-weekday) % 7)-7*(-n-1)
+    return pd.DatetimeIndex(first+pd.to_timedelta(shift, unit='D'))
+
+
+def _observed(dates, saturday=True):
+    """
+    Returns:
+        dates of fixed holidays moved off weekends, Saturdays to Friday
+        (unless not saturday) and Sundays to Monday
+    """
+    weekday = dates.weekday
+    shift = np.where(weekday == 6, 1, np.where(weekday == 5, -1, 0))
+    dates = dates+pd.to_timedelta(shift, unit='D')
+    if not saturday:
+        dates = dates[weekday != 5]
+    return dates
+
+
+def nyse_holidays(years):
+    """
+    Arguments:
+        years: array of years
+
+    Returns:
+        DatetimeIndex of NYSE full-day holidays in years
+    """
+    years = np.asarray(years)
+    date = lambda month, day: pd.DatetimeIndex(pd.to_datetime(
+        {'year': years, 'month': month, 'day': day}))
+    month, day = _easter(years)
+    holidays = [
+        # NYSE does not close the Friday before a Saturday New Year's Day
+        _observed(date(1, 1), saturday=False),
+        _nth_weekday(years[years >= 1998], 1, 0, 3), # Martin Luther King Jr.
+        _nth_weekday(years, 2, 0, 3), # Washington's Birthday
+        date(month, day)-pd.Timedelta(2, unit='D'), # Good Friday
+        _nth_weekday(years, 5, 0, -1), # Memorial Day
+        _observed(pd.DatetimeIndex(pd.to_datetime(
+            {'year': years[years >= 2022], 'month': 6, 'day': 19}))),
+        _observed(date(7, 4)), # Independence Day
+        _nth_weekday(years, 9, 0, 1), # Labor Day
+        _nth_weekday(years, 11, 3, 4), # Thanksgiving
+        _observed(date(12, 25)), # Christmas
+        pd.DatetimeIndex(_nyse_closures)
+    ]
+    return holidays[0].append(holidays[1:]).unique().sort_values()
+
+
+def nyse_early_closes(years):
+    """
+    Arguments:
+        years: array of years
+
+    Returns:
+        DatetimeIndex of NYSE 1 pm closes (Independence Day eve, the day
+        after Thanksgiving, and Christmas Eve) in years
+    """
+    years = np.asarray(years)
+    date = lambda month, day: pd.DatetimeIndex(pd.to_datetime(
+        {'year': years, 'month': month, 'day': day}))
+    # Eves falling on a Friday are holidays observed, not early closes
+    eves = date(7, 3).append(date(12, 24))
+    eves = eves[eves.weekday < 4]
+    thanksgiving = _nth_weekday(years, 11, 3, 4)+pd.Timedelta(1, unit='D')
+    return eves.append(thanksgiving).sort_values()
+
+
+class trading_calendar:
+    """
+    Trading Calendar
+        Table of an exchange's sessions between two years, with session
+        open and close times. Lookups take arrays of dates (naive wall
+        times of the exchange, timezone aware times, or seconds since
+        epoch) and are vectorized with searchsorted and array indexing.
+
+    Example:
+        cal = exchange_calendar('NYSE')
+        cal.first_of_month(prices.data.index)
+    """
+
+    # Day of no session, e.g., months without any; days before 1970 are
+    # negative, so not -1
+    _none = np.iinfo(np.int64).min
+
+    def __init__(self, holidays, early_closes, timezone='America/New_York',
+                 open='09:30', close='16:00', early_close='13:00',
+                 years=(1980, 2040)):
+        """
+        Arguments:
+            holidays: function of array of years returning DatetimeIndex
+                      of holidays
+            early_closes: function of array of years returning
+                          DatetimeIndex of early close days
+
+        Keyword arguments:
+            timezone: one of the pytz timezones of the exchange
+            open: wall time sessions open
+            close: wall time sessions close
+            early_close: wall time sessions close on early close days
+            years: first and last year of the table (inclusive)
+        """
+        self.timezone = timezone
+        self.years = years
+        years = np.arange(years[0], years[1]+1)
+        days = np.arange(np.datetime64('{:d}-01-01'.format(years[0])),
+                         np.datetime64('{:d}-01-01'.format(years[-1]+1)))
+        # Weekdays, 1970-01-01 was a Thursday
+        days = days[(days.astype(np.int64)+3) % 7 < 5]
+        days = pd.DatetimeIndex(days.astype('datetime64[ns]'))
+        days = days[~days.isin(holidays(years))]
+        # Sessions as days since 1970-01-01, keeps lookups integer math
+        self.days = days.values.astype('datetime64[D]').astype(np.int64)
+        self._open = np.full(len(days), pd.Timedelta(open+':00').value)
+        self._close = np.full(len(days), pd.Timedelta(close+':00').value)
+        self._close[days.isin(early_closes(years))] = pd.Timedelta(
+            early_close+':00').value
+        self._first, self._last = self.days[0], self.days[-1]
+        # First and last session of each week and month, indexed by the
+        # week (Monday based) and month since first session
+        self._week0 = self._week(self._first)
+        self._month0 = self._month(self._first)
+        self._week_first, self._week_last = self._bounds(
+            self._week(self.days)-self._week0)
+        self._month_first, self._month_last = self._bounds(
+            self._month(self.days)-self._month0)
+        return
+
+
+    @staticmethod
+    def _week(days):
+        # 1970-01-01 was a Thursday
+        return (days+3)//7
+
+
+    @staticmethod
+    def _month(days):
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(
+            np.int64)
+
+
+    def _bounds(self, period):
+        """
+        Returns:
+            arrays of first and last session of each period, _none if none
+        """
+        first = np.full(period[-1]+1, self._none, dtype=np.int64)
+        last = np.full(period[-1]+1, self._none, dtype=np.int64)
+        unique, i = np.unique(period, return_index=True)
+        first[unique] = self.days[i]
+        last[unique] = self.days[np.append(i[1:], len(period))-1]
+        return first, last
+
+
+    def _days(self, dates):
+        """
+        Returns:
+            array of exchange days (since 1970-01-01) of dates
+        """
+        if np.ndim(dates) == 0:
+            dates = [dates]
+        if not isinstance(dates, pd.DatetimeIndex):
+            dates = np.asarray(dates)
+            if dates.dtype.kind in 'iuf':
+                dates = pd.to_datetime(dates, unit='s', utc=True)
+            dates = pd.DatetimeIndex(dates)
+        if dates.tz is not None:
+            dates = dates.tz_convert(self.timezone).tz_localize(None)
+        days = dates.values.astype('datetime64[D]').astype(np.int64)
+        if len(days) and (days.min() < self._first-7 or
+                          days.max() > self._last+7):
+            raise ValueError('dates outside of calendar years {:d} to {:d}'
+                             .format(*self.years))
+        return days
+
+
+    @classmethod
+    def _dates(cls, days):
+        """
+        Returns:
+            DatetimeIndex of days, NaT where _none
+        """
+        dates = days.astype('datetime64[D]')
+        dates[days == cls._none] = np.datetime64('NaT')
+        return pd.DatetimeIndex(dates.astype('datetime64[ns]'))
+
+
+    def _lookup(self, table, period):
+        return table[np.clip(period, 0, len(table)-1)]
+
+
+    def is_session(self, dates):
+        """
+        Returns:
+            boolean array of whether dates are trading days
+        """
+        days = self._days(dates)
+        i = np.searchsorted(self.days, days).clip(0, len(self.days)-1)
+        return self.days[i] == days
+
+
+    def sessions(self, start, end):
+        """
+        Returns:
+            DatetimeIndex of trading days between start and end (inclusive)
+        """
+        start, end = self._days([start, end])
+        i, j = np.searchsorted(self.days, [start, end+1])
+        return self._dates(self.days[i:j])
+
+
+    def shift(self, dates, n=1):
+        """
+        Description:
+            Shifts dates by n trading days, dates that aren't trading days
+            are first rolled forward (backward if n < 0) to one.
+
+        Returns:
+            DatetimeIndex of shifted trading days
+        """
+        days = self._days(dates)
+        if n >= 0:
+            i = np.searchsorted(self.days, days, side='left')+n
+        else:
+            i = np.searchsorted(self.days, days, side='right')-1+n
+        return self._dates(self.days[np.clip(i, 0, len(self.days)-1)])
+
+
+    def first_of_week(self, dates):
+        """
+        Returns:
+            DatetimeIndex of first trading day of each date's week
+        """
+        week = self._week(self._days(dates))-self._week0
+        return self._dates(self._lookup(self._week_first, week))
+
+
+    def last_of_week(self, dates):
+        """
+        Returns:
+            DatetimeIndex of last trading day of each date's week
+        """
+        week = self._week(self._days(dates))-self._week0
+        return self._dates(self._lookup(self._week_last, week))
+
+
+    def first_of_month(self, dates):
+        """
+        Returns:
+            DatetimeIndex of first trading day of each date's month
+        """
+        month = self._month(self._days(dates))-self._month0
+        return self._dates(self._lookup(self._month_first, month))
+
+
+    def last_of_month(self, dates):
+        """
+        Returns:
+            DatetimeIndex of last trading day of each date's month
+        """
+        month = self._month(self._days(dates))-self._month0
+        return self._dates(self._lookup(self._month_last, month))
+
+
+    def _session_time(self, dates, times):
+        days = self._days(dates)
+        i = np.searchsorted(self.days, days).clip(0, len(self.days)-1)
+        hit = self.days[i] == days
+        result = (days*86400*10**9+times[i]).astype('datetime64[ns]')
+        result[~hit] = np.datetime64('NaT')
+        return pd.DatetimeIndex(result)
+
+
+    def session_open(self, dates):
+        """
+        Returns:
+            DatetimeIndex of exchange wall times sessions of dates open,
+            NaT for dates that aren't trading days
+        """
+        return self._session_time(dates, self._open)
+
+
+    def session_close(self, dates):
+        """
+        Returns:
+            DatetimeIndex of exchange wall times sessions of dates close,
+            NaT for dates that aren't trading days
+        """
+        return self._session_time(dates, self._close)
+
+
+# Years of the calendar tables, widened for lookups outside of them
+_calendar_years = (1980, 2040)
+
+
+@functools.lru_cache(maxsize=None)
+def _nyse_calendar(years):
+    return trading_calendar(nyse_holidays, nyse_early_closes, years=years)
+
+
+def exchange_calendar(exchange='NYSE', years=None):
+    """
+    Arguments:
+        exchange: 'NYSE', or a YF exchangeName of a US exchange (e.g.,
+                  'NMS' for Nasdaq) sharing NYSE's calendar
+
+    Keyword arguments:
+        years: (first, last) years the calendar must cover, beyond
+               _calendar_years builds (and keeps) a wider table
+
+    Returns:
+        trading_calendar of exchange, built once and shared by exchanges
+        of the same calendar
+    """
+    if exchange != 'NYSE' and exchange not in _us_exchanges:
+        raise ValueError('no trading calendar for exchange {:s}'
+                         .format(exchange))
+    first, last = _calendar_years
+    if years is not None:
+        first, last = min(first, int(years[0])), max(last, int(years[1]))
+    return _nyse_calendar((first, last))
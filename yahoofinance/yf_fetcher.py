@@ -10,12 +10,25 @@ Useful resources used in project:
     * https://help.yahoo.com/kb/finance-for-web/adjusted-close-sln28256.html
 """
 
+import time
 import textwrap
+import threading
 import requests
 import numpy as np
 import pandas as pd
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+try:
+    import orjson as json
+except ImportError:
+    import json
 
 from utils import *
+from yf_cache import price_cache
+from yf_limiter import rate_limiter
+from yf_calendar import exchange_calendar
 
 
 class yf_fetcher:
@@ -30,6 +43,8 @@ class yf_fetcher:
     _fundamental_url = _yahoo_url+'/v10/finance/quoteSummary/'
     
     _request_header = {'User-Agent': 'Mozilla/5.0'}
+    # Transient statuses worth retrying (rate limited and server errors)
+    _retry_status = [429, 500, 502, 503, 504]
     
     _valid_subday_intervals = ['1m', '2m', '5m', '15m',
                                '30m', '60m', '90m', '1h']
@@ -42,6 +57,16 @@ class yf_fetcher:
                             '5d':432000, '1wk':604800, '1mo':2592000,
                             '3mo':7776000}
     
+    # Longest period YF serves subday bars for in a single request
+    _max_request_seconds = {'1m':7*86400, '2m':60*86400, '5m':60*86400,
+                            '15m':60*86400, '30m':60*86400, '90m':60*86400,
+                            '60m':730*86400, '1h':730*86400}
+
+    # dtypes of price and volume columns, compact halves price frame memory;
+    # volume is signed so differences of it (e.g., RC) can't wrap around
+    _dtype_policies = {'default': {'price': 'float64', 'volume': 'int64'},
+                       'compact': {'price': 'float32', 'volume': 'int32'}}
+
     _valid_modules = ['assetProfile', 'summaryProfile', 'summaryDetail',
                       'esgScores', 'price', 'incomeStatementHistory',
                       'incomeStatementHistoryQuarterly', 'balanceSheetHistory',
@@ -57,8 +82,107 @@ class yf_fetcher:
                       'earningsHistory', 'earningsTrend', 'industryTrend',
                       'indexTrend', 'sectorTrend']
 
+    # Seconds fundamentals modules are cached for before being refetched
+    _default_module_ttl = 3600
+    _module_ttl = {'price': 60, 'summaryDetail': 300, 'financialData': 300,
+                   'esgScores': 86400, 'assetProfile': 86400,
+                   'summaryProfile': 86400, 'secFilings': 86400,
+                   'incomeStatementHistory': 86400,
+                   'incomeStatementHistoryQuarterly': 86400,
+                   'balanceSheetHistory': 86400,
+                   'balanceSheetHistoryQuarterly': 86400,
+                   'cashflowStatementHistory': 86400,
+                   'cashflowStatementHistoryQuarterly': 86400,
+                   'earningsHistory': 86400}
+
+    # Seconds option chains (and expirations) are cached for
+    _options_ttl = 60
+
+    # YF contract fields of option chains, and their column names
+    _option_fields = {'strike': 'strike', 'bid': 'bid', 'ask': 'ask',
+                      'lastPrice': 'last', 'impliedVolatility': 'iv'}
+    _option_counts = {'volume': 'volume', 'openInterest': 'open_interest'}
+
     
-    def __init__(self):
+    def __init__(self, workers=1, yahoo_url=None, pool_size=None,
+                 timeout=(5, 30), retries=3, backoff=0.5, max_backoff=60,
+                 cache=None, index_tz='naive', dtypes='default',
+                 module_ttl=None, stats=None, limiter=None, priority=0,
+                 options_ttl=None):
+        """
+        Keyword arguments:
+            workers: maximum number of symbols fetched concurrently, i.e.,
+                     the number of requests in-flight (default: 1)
+            yahoo_url: base url of the API, e.g., a local stand-in server
+                       (default: https://query1.finance.yahoo.com)
+            pool_size: keep-alive connections kept open to the API host
+                       (default: larger of 10 and workers)
+            timeout: seconds to wait on (connect, read) of a request
+            retries: times a failed or throttled request is retried
+            backoff: seconds waited before first retry, doubling thereafter
+            max_backoff: longest wait between retries (seconds)
+            cache: price_cache (or bar_store, memory-mapped), or directory
+                   of a price_cache, used to store price history and only
+                   fetch missing ranges (default: None)
+            index_tz: timezone of price indices; 'naive' for exchange wall
+                      time, 'local' for timezone aware exchange time, or
+                      'UTC' (default: naive)
+            dtypes: 'default', 'compact', or dict of 'price' and 'volume'
+                    dtypes of price frames (default: float64 and int64)
+            module_ttl: dict of seconds to cache fundamentals modules for,
+                        overriding _module_ttl (0 disables caching)
+            stats: yf_stats recording stage timings and counters of the
+                   fetcher and its price_data objects (default: None)
+            limiter: rate_limiter, or its rate in requests per second,
+                     scheduling the fetcher's requests; share one between
+                     fetchers to limit their combined rate (default: None)
+            priority: priority of the fetcher's requests in the limiter,
+                      lower served first (default: 0)
+            options_ttl: seconds to cache option chains for, overriding
+                         _options_ttl (0 disables caching)
+        """
+        self.workers = workers
+        # Symbols and their chunks are fetched on nested pools, this bounds
+        # the requests they have in-flight together
+        self._in_flight = threading.BoundedSemaphore(max(1, workers or 1))
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        if type(cache) is str:
+            cache = price_cache(cache)
+        self.cache = cache
+        self.index_tz = index_tz
+        if type(dtypes) is str:
+            dtypes = self._dtype_policies[dtypes]
+        self.dtypes = dict(self._dtype_policies['default'], **dtypes)
+        self.module_ttl = dict(self._module_ttl, **(module_ttl or {}))
+        self.stats = stats
+        if isinstance(limiter, (int, float)):
+            limiter = rate_limiter(rate=limiter)
+        self.limiter = limiter
+        self.priority = priority
+        self._fundamentals = {}
+        self._fundamentals_lock = threading.Lock()
+        self.options_ttl = (self._options_ttl if options_ttl is None
+                            else options_ttl)
+        self._options = {}
+        self._options_lock = threading.Lock()
+        if pool_size is None:
+            pool_size = max(10, workers or 1)
+        # One session shares keep-alive connections between all requests
+        self.session = requests.Session()
+        self.session.headers.update(self._request_header)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.failed = {}
+        if yahoo_url is not None:
+            self._yahoo_url = yahoo_url
+            self._options_url = yahoo_url+'/v7/finance/options/'
+            self._price_url = yahoo_url+'/v8/finance/chart/'
+            self._fundamental_url = yahoo_url+'/v10/finance/quoteSummary/'
         return
 
     
@@ -87,8 +211,172 @@ class yf_fetcher:
         return 0
         
         
+    def _stage(self, name):
+        """
+        Returns:
+            context manager timing a stage in self.stats, if set
+        """
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.stage(name)
+
+
+    def _count(self, name, n=1):
+        if self.stats is not None:
+            self.stats.count(name, n)
+        return
+
+
+    def _retry_after(self, response):
+        """
+        Description:
+            Parses the Retry-After header of a response, which is either
+            a number of seconds or a HTTP date.
+
+        Returns:
+            Seconds to wait before retrying, or None if no header given
+        """
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is None:
+            return None
+        try:
+            return max(0., float(retry_after))
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0., date.timestamp()-time.time())
+
+
+    def _get(self, xurl, label=''):
+        """
+        Description:
+            Sends a GET request over the pooled session. Connection errors,
+            timeouts and transient statuses (429 and 5xx) are retried with
+            exponential backoff, unless the server asks for a specific wait
+            with a Retry-After header. With a limiter, requests wait for a
+            token, and throttled requests are rescheduled by the limiter.
+            At most self.workers requests are in-flight at once.
+
+        Arguments:
+            xurl: url requested
+
+        Keyword arguments:
+            label: prefix of error messages, e.g., the symbol
+
+        Returns:
+            requests response, or None if request did not succeed
+        """
+        for attempt in range(self.retries+1):
+            delay = None
+            if self.limiter is not None:
+                with self._stage('rate_wait'):
+                    self.limiter.acquire(self.priority)
+            self._count('requests')
+            try:
+                with self._in_flight, self._stage('http'):
+                    response = self.session.get(xurl, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as err:
+                response = err
+            else:
+                self._count('body_bytes', len(response.content))
+                self._count('bytes', self._wire_bytes(response))
+                if response.status_code not in self._retry_status:
+                    if self.limiter is not None and response.ok:
+                        self.limiter.succeeded()
+                    break
+                delay = self._retry_after(response)
+                if response.status_code == 429:
+                    self._count('throttled')
+                    if self.limiter is not None:
+                        # Limiter holds back all its fetchers' requests
+                        self.limiter.throttled(None if delay is None else
+                                               min(delay, self.max_backoff))
+                        delay = 0
+            if attempt == self.retries:
+                break
+            self._count('retries')
+            if delay is None:
+                delay = self.backoff*2**attempt
+            time.sleep(min(delay, self.max_backoff))
+        if isinstance(response, Exception) or response.status_code != 200:
+            self._count('failed_requests')
+        if isinstance(response, Exception):
+            self.error(label, 'request failed after {:d} attempts ({:s})'
+                       .format(attempt+1, repr(response)))
+            return None
+        if response.status_code != 200:
+            self.error(label, 'request reponse not okay ({:d} {:s})'
+                       .format(response.status_code, response.reason))
+            return None
+        return response
+
+
+    @staticmethod
+    def _wire_bytes(response):
+        """
+        Returns:
+            bytes of response's body received, before decoding any
+            content encoding (e.g., gzip); the decoded length if neither
+            urllib3 nor a Content-Length header tells, e.g., of chunked
+            responses
+        """
+        try:
+            # Bytes urllib3 read off the connection, once content is read
+            received = int(response.raw.tell())
+        except (AttributeError, TypeError, ValueError):
+            received = 0
+        if received > 0:
+            return received
+        length = response.headers.get('Content-Length')
+        return int(length) if length else len(response.content)
+
+
+    def _cast(self, data, dtypes=None):
+        """
+        Description:
+            Casts price frame to the dtypes policy. Volume is kept as int64
+            if it overflows the volume dtype.
+
+        Arguments:
+            data: dataframe of prices
+
+        Keyword arguments:
+            dtypes: dict of 'price' and 'volume' dtypes (default:
+                    self.dtypes)
+
+        Returns:
+            dataframe of prices with dtypes of policy
+        """
+        policy = self.dtypes if dtypes is None else dtypes
+        dtypes = {c: policy['price'] for c in data.columns if c != 'volume'}
+        volume = np.dtype(policy['volume'])
+        dtypes['volume'] = np.int64
+        if len(data) and volume.kind in 'iu':
+            info = np.iinfo(volume)
+            if (data['volume'].min() >= info.min and
+                data['volume'].max() <= info.max):
+                dtypes['volume'] = volume
+        elif volume.kind == 'f':
+            dtypes['volume'] = volume
+        return data.astype(dtypes)
+
+
+    def _json(self, response):
+        """
+        Description:
+            Decodes the JSON body of a response, with orjson if installed.
+        """
+        with self._stage('decode'):
+            return json.loads(response.content)
+
+
     def fetch_price_history(self, symbols, period1, period2, interval,
-                            PrePost=False, div=False, split=False):
+                            PrePost=False, div=False, split=False,
+                            workers=None):
         """
         Description:
             Fetches the price history of stocks between two dates at some
@@ -104,6 +392,12 @@ class yf_fetcher:
             PrePost: include pre and post market data (boolean)
             div: include dividend data (boolean)
             split: include split data (boolean)
+            workers: symbols fetched concurrently (default: self.workers),
+                     requests in-flight are still at most self.workers
+
+        Notes:
+            ^symbols that fail to fetch are left out of the returned dicts,
+             and the reason is recorded in self.failed
 
         Returns:
             tuple of meta data, and pandas dataframe of prices
@@ -115,29 +409,87 @@ class yf_fetcher:
             return 1
 
         if type(symbols) is str:
-            return self._fetch_price_history(symbols, period1, period2,
-                                             interval, PrePost=PrePost, div=div,
-                                             split=split)
+            return self._fetch_symbol(symbols, period1, period2, interval,
+                                      PrePost=PrePost, div=div, split=split)
         elif (type(symbols) is list and
               all(type(symbol) is str for symbol in symbols)):
+            def fetch(symbol):
+                m, d = self._fetch_symbol(symbol, period1, period2, interval,
+                                          PrePost=PrePost, div=div,
+                                          split=split)
+                return None if m is None and d is None else (m, d)
+            self.failed = {}
             meta = {}
             data = {}
-            for symbol in symbols:
-                m, d = self._fetch_price_history(symbol, period1, period2,
-                                                 interval, PrePost=PrePost,
-                                                 div=div, split=split)
-                if m is None and d is None:
-                    continue
-                meta.update({symbol: m})
-                data.update({symbol: d})
+            for symbol, result in zip(symbols,
+                                      self._map(fetch, symbols, workers)):
+                if self._ok(symbol, result):
+                    meta[symbol], data[symbol] = result
             return meta, data
         else:
             self.error('')
             return 1
+
+
+    def _fetch_symbol(self, symbol, *args, **kwargs):
+        """
+        Description:
+            Fetches the price history of a single symbol, through the cache
+            if one is set.
+        """
+        if self.cache is not None:
+            return self.cache.fetch(self, symbol, *args, **kwargs)
+        return self._fetch_price_history(symbol, *args, **kwargs)
+
+
+    def _map(self, func, items, workers=None):
+        """
+        Description:
+            Calls func on each item, on workers threads (default:
+            self.workers). An exception raised for one item is returned
+            as its result rather than raised, letting the other items
+            complete.
+
+        Returns:
+            list of results, in the order of items
+        """
+        if workers is None:
+            workers = self.workers
+        def call(item):
+            try:
+                return func(item)
+            except Exception as err:
+                return err
+        if workers is None or workers <= 1:
+            return list(map(call, items))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(call, items))
+
+
+    def _ok(self, symbol, result, reason='no data returned'):
+        """
+        Description:
+            Records in self.failed why symbol failed if result (see _map)
+            is an exception or None, or symbol already failed.
+
+        Returns:
+            whether result can be used
+        """
+        if symbol in self.failed:
+            return False
+        if isinstance(result, Exception):
+            self.error(symbol, 'fetch failed:', repr(result))
+            self.failed[symbol] = repr(result)
+            return False
+        if result is None:
+            self.failed[symbol] = reason
+            return False
+        return True
+
         
     def _fetch_price_history(self, symbol, period1, period2, interval,
                              PrePost=False, div=False, split=False,
-                             market_tz='America/New_York'):
+                             market_tz='America/New_York', dtypes=None):
         """
         Description:
             Fetches the price history of a single stocks between two dates
@@ -153,6 +505,8 @@ class yf_fetcher:
             PrePost: include pre and post market data (boolean)
             div: include dividend data (boolean)
             split: include split data (boolean)
+            dtypes: dtypes policy of the returned frame (default:
+                    self.dtypes), see _cast
             
         Todo:
             -divide nand split data not handled
@@ -173,13 +527,61 @@ class yf_fetcher:
                                         self._seconds_in_interval[interval]))
             return None, None
         # Ensure duration bound at least one FTDM for month intervals
-        # We have to assume a timezone for the market
-        if (interval in ['1mo', '3mo'] and not
-            (period1-UT_to_FTDM_UT(period1, timezone=market_tz) < 86400 or
-             period2-UT_to_FTDM_UT(period2, timezone=market_tz) >= 0)):
-            self.error('interval does not enclose any first trading '
-                       'days of the month')
+        # We have to assume a timezone (and calendar) for the market
+        if interval in ['1mo', '3mo']:
+            cal = exchange_calendar()
+            start, end = UT_to_DTI([period1, period2], timezone=market_tz,
+                                   normalize=True)
+            try:
+                sessions = cal.sessions(start, end)
+            except ValueError:
+                # Outside the calendar's years, leave it to YF
+                sessions = None
+            if (sessions is not None and
+                not (sessions == cal.first_of_month(sessions)).any()):
+                self.error('interval does not enclose any first trading '
+                           'days of the month')
+                return None, None
+        # Split periods longer than YF serves per request into chunks
+        span = self._max_request_seconds.get(interval)
+        if span is None or period2-period1 <= span:
+            return self._fetch_price_chunk(symbol, period1, period2,
+                                           interval, PrePost=PrePost, div=div,
+                                           split=split, dtypes=dtypes)
+        nchunks = -(-(period2-period1)//span)
+        bounds = np.linspace(period1, period2, nchunks+1).astype(int)
+        # Only the final chunk can end with the live bar
+        fetch = lambda p1, p2: self._fetch_price_chunk(
+            symbol, int(p1), int(p2), interval, PrePost=PrePost, div=div,
+            split=split, drop_last=(p2 == period2), dtypes=dtypes)
+        with ThreadPoolExecutor(max_workers=max(1, self.workers or 1)) as pool:
+            results = list(pool.map(fetch, bounds[:-1], bounds[1:]))
+        if any(meta is None for meta, data in results):
+            self.error(symbol, 'failed to fetch {:d} of {:d} chunks'
+                       .format(sum(meta is None for meta, data in results),
+                               nchunks))
             return None, None
+        data = pd.concat([data for meta, data in results])
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        return results[-1][0], data
+
+
+    def _fetch_price_chunk(self, symbol, period1, period2, interval,
+                           PrePost=False, div=False, split=False,
+                           drop_last=True, dtypes=None):
+        """
+        Description:
+            Fetches the price history of a single stock with a single
+            request, see _fetch_price_history.
+
+        Keyword arguments:
+            drop_last: drop last bar of subday intervals, the live price
+                       (boolean)
+            dtypes: dtypes policy of the returned frame, see _cast
+
+        Returns:
+            tuple of meta data, and pandas dataframe of prices
+        """
         # Build request url
         xurl = self._price_url
         xurl += ('{:s}?symbol={:s}&period1={:d}&period2={:d}&interval={:s}'
@@ -195,16 +597,24 @@ class yf_fetcher:
             else:
                 xurl += 'split'
         # send request and check for errors
-        try:
-            response = requests.get(xurl, headers=self._request_header)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as err:
-            print(err)
-        if response.status_code != 200:
-            self.error('{:s} request reponse not okay ({:d} {:s})'
-                       .format(symbol, response.status_code,
-                        requests.status_codes._codes[response.status_code][0]))
-        reponse_json = response.json()
+        response = self._get(xurl, symbol)
+        if response is None:
+            return None, None
+        return self._parse_chart(symbol, self._json(response), period1,
+                                 period2, interval, div=div, split=split,
+                                 drop_last=drop_last, dtypes=dtypes)
+
+
+    def _parse_chart(self, symbol, reponse_json, period1, period2, interval,
+                     div=False, split=False, drop_last=True, dtypes=None):
+        """
+        Description:
+            Parses a decoded chart response into a dataframe of prices,
+            see _fetch_price_chunk.
+
+        Returns:
+            tuple of meta data, and pandas dataframe of prices
+        """
         if list(reponse_json.keys()) != ['chart']:
             self.error(symbol, "return unexpected keys for response:",
                        reponse_json.keys())
@@ -233,15 +643,11 @@ class yf_fetcher:
         meta = result['meta']
         exchangeTZ = meta['exchangeTimezoneName']
         timestamp = result['timestamp']
-        # Convert unix timestamps to human read dates based on dataGranularity
-        if meta['dataGranularity'] in self._valid_subday_intervals:
-            date = pd.to_datetime(
-                UT_to_str(timestamp, fmt='%Y-%m-%d %H:%M:%S',
-                          timezone=exchangeTZ))
-        else:
-            date = pd.to_datetime(
-                UT_to_str(timestamp, fmt='%Y-%m-%d',
-                          timezone=meta['exchangeTimezoneName']))
+        # Convert unix timestamps to dates based on dataGranularity
+        with self._stage('timestamps'):
+            date = UT_to_DTI(timestamp, timezone=exchangeTZ, tz=self.index_tz,
+                             normalize=(meta['dataGranularity'] not in
+                                        self._valid_subday_intervals))
         # If returning dividends or splits check if any occured in time frame
         if div or split:
             if 'events' not in list(result.keys()):
@@ -285,34 +691,28 @@ class yf_fetcher:
                    for elem in ['high', 'low', 'volume', 'open', 'close']):
             self.error('')
             return None, None
-        q_high = quote['high']
-        q_low = quote['low']
-        q_volume = quote['volume']
-        q_open = quote['open']
-        q_close = quote['close']
+        # Map arrays straight into typed buffers, nulls become NaN
+        columns = {'open': quote['open'], 'close': quote['close']}
         if 'adjclose' not in list(indicators.keys()):
             # Only issue warning if expected adjclose (superday intervals)
             if interval not in self._valid_subday_intervals:
                 self.wraprint('Warning {:s}: expected adjclose on interval {:s}'
                               .format(symbol, interval))
-            data = pd.DataFrame(np.column_stack([q_open, q_close, q_low, q_high,
-                                                 q_volume]),
-                                columns=['open', 'close','low', 'high',
-                                         'volume'],
-                                index=date)
         else:
-            adjclose = indicators['adjclose'][0]['adjclose']
-            data = pd.DataFrame(np.column_stack([q_open, q_close, adjclose,
-                                                 q_low, q_high, q_volume]),
-                                columns=['open', 'close', 'adjclose',
-                                         'low', 'high', 'volume'],
-                                index=date)
-        # subday intervals fetch current price as last data point, we drop that
-        if interval in self._valid_subday_intervals:
-            data.drop(data.tail(1).index, inplace=True)
-        # subday intervals return timestamps uptil current time with null results
-        # for data outside period1 and period2, drop these or any other null rows
-        data.dropna(inplace=True)
+            columns['adjclose'] = indicators['adjclose'][0]['adjclose']
+        columns.update({'low': quote['low'], 'high': quote['high'],
+                        'volume': quote['volume']})
+        with self._stage('frame'):
+            data = pd.DataFrame({c: np.array(v, dtype=np.float64)
+                                 for c, v in columns.items()}, index=date)
+            # subday intervals fetch current price as last data point, drop it
+            if drop_last and interval in self._valid_subday_intervals:
+                data.drop(data.tail(1).index, inplace=True)
+            # subday intervals return timestamps uptil current time with null
+            # results for data outside period1 and period2, drop these or any
+            # other null rows
+            data.dropna(inplace=True)
+            data = self._cast(data, dtypes)
         
         return meta, data
 
@@ -320,11 +720,13 @@ class yf_fetcher:
     def fetch_fundamentals(self, symbol, modules):
         """
         Description:
-            
+            Fetches fundamental data modules of a stock. Modules fetched
+            within their time-to-live (see module_ttl) are returned from
+            memory, and only the rest are requested.
 
         Arguements:
             symbol: stock ticker
-            modules:
+            modules: module or list of modules, see valid_modules()
 
         Notes:
             incomeStatementHistory limited to last 3 years without yahoo premium
@@ -332,37 +734,234 @@ class yf_fetcher:
         Returns:
             Fundamentals requested
         """
-        xurl = self._fundamental_url+symbol+'?modules='
         if type(modules) is str:
-            xurl += modules
-        elif (type(modules) is list and
-              all(type(module) is str for module in modules)):
-            for module in modules:
-                xurl += '{:s}%2C'.format(module)
-        else:
+            modules = [modules]
+        elif not (type(modules) is list and
+                  all(type(module) is str for module in modules)):
             self.wraprint('modules must be a string or list of strings.')
             return
-        response = requests.get(xurl, headers=self._request_header)
-        if response.status_code != 200:
-            print(response.status_code)
+        now = time.time()
+        result = {}
+        with self._fundamentals_lock:
+            for module in modules:
+                cached = self._fundamentals.get((symbol, module))
+                ttl = self.module_ttl.get(module, self._default_module_ttl)
+                if cached is not None and now-cached[0] < ttl:
+                    result[module] = cached[1]
+        stale = [module for module in modules if module not in result]
+        self._count('module_cache_hits', len(result))
+        self._count('module_cache_misses', len(stale))
+        if not stale:
+            return result
+        xurl = self._fundamental_url+symbol+'?modules='
+        for module in stale:
+            xurl += '{:s}%2C'.format(module)
+        response = self._get(xurl, symbol)
+        if response is None:
             return
-        quoteSummary = response.json()['quoteSummary']
+        quoteSummary = self._json(response)['quoteSummary']
         if quoteSummary['error'] is not None:
             self.wraprint(quoteSummary['error'])
             return
-        result = quoteSummary['result'][0]
+        fetched = quoteSummary['result'][0]
+        with self._fundamentals_lock:
+            for module, value in fetched.items():
+                self._fundamentals[(symbol, module)] = (now, value)
+        result.update(fetched)
         return result
 
+
+    def fetch_fundamentals_bulk(self, symbols, modules, workers=None):
+        """
+        Description:
+            Fetches fundamental data modules of many stocks concurrently,
+            see fetch_fundamentals.
+
+        Arguments:
+            symbols: list of stock tickers
+            modules: module or list of modules, see valid_modules()
+
+        Keyword arguments:
+            workers: symbols fetched concurrently (default: self.workers)
+
+        Notes:
+            ^symbols that fail to fetch are left out of the returned dict,
+             and the reason is recorded in self.failed
+
+        Returns:
+            dict of fundamentals requested for each symbol
+        """
+        fetch = lambda symbol: self.fetch_fundamentals(symbol, modules)
+        self.failed = {}
+        fundamentals = {}
+        for symbol, result in zip(symbols,
+                                  self._map(fetch, symbols, workers)):
+            if self._ok(symbol, result):
+                fundamentals[symbol] = result
+        return fundamentals
+
     
-    def fetch_options(self, symbol, expiration=None):
+    def _parse_options(self, result):
+        """
+        Description:
+            Maps the contracts of an options payload into typed columns,
+            one row per contract.
+
+        Arguments:
+            result: result of an optionChain payload
+
+        Returns:
+            dataframe of contracts' expiry, type, strike, bid, ask, last
+            price, implied volatility (iv), volume, and open interest
         """
-        NOT WORKING, options_url no good?
+        contracts, codes, expiry = [], [], []
+        for chain in result.get('options', []):
+            for code, kind in enumerate(['calls', 'puts']):
+                listed = chain.get(kind) or []
+                contracts += listed
+                codes += [code]*len(listed)
+                expiry += [chain['expirationDate']]*len(listed)
+        # Expirations are dates at midnight UTC
+        data = {'expiry': np.array(expiry, dtype=np.int64).astype(
+                    'datetime64[s]'),
+                'type': pd.Categorical.from_codes(codes, ['call', 'put'])}
+        for field, column in self._option_fields.items():
+            data[column] = np.array([c.get(field) for c in contracts],
+                                    dtype=np.float64).astype(
+                                        self.dtypes['price'])
+        # Contracts that didn't trade come without volume
+        for field, column in self._option_counts.items():
+            data[column] = np.array([c.get(field) or 0 for c in contracts],
+                                    dtype=np.int64)
+        return pd.DataFrame(data)
+
+
+    def _fetch_options(self, symbol, expiration=None):
         """
+        Description:
+            Fetches the option chain of one expiration of a stock, through
+            the cache of chains fetched within options_ttl. Each payload
+            lists all expirations, and holds the nearest expiration's
+            chain if none is requested; both are cached.
+
+        Arguments:
+            symbol: stock ticker
+
+        Keyword arguments:
+            expiration: expiration date (seconds since epoch), None only
+                        lists expirations
+
+        Returns:
+            tuple of list of expirations (seconds since epoch), and
+            dataframe of chain (None if expiration is None or isn't
+            listed; None, None if request failed)
+        """
+        now = time.time()
+        fresh = lambda x: x is not None and now-x[0] < self.options_ttl
+        with self._options_lock:
+            listed = self._options.get((symbol, None))
+            cached = self._options.get((symbol, expiration))
+        if fresh(listed) and (expiration is None or fresh(cached)):
+            self._count('options_cache_hits')
+            return listed[1], None if expiration is None else cached[1]
+        self._count('options_cache_misses')
         xurl = self._options_url+symbol
-        if type(expiration) is int:
-            xurl += '?date={:d}'.format(expiration)
-        response = requests.get(xurl, headers=self._request_header)
-        if response.status_code != 200:
-            self.wraprint(response.status_code)
-            return
-        return response.json() 
\ No newline at end of file
+        if expiration is not None:
+            xurl += '?date={:d}'.format(int(expiration))
+        response = self._get(xurl, symbol)
+        if response is None:
+            return None, None
+        optionChain = self._json(response)['optionChain']
+        if optionChain['error'] is not None or not optionChain['result']:
+            self.error(symbol, optionChain['error'] or 'no options')
+            return None, None
+        result = optionChain['result'][0]
+        expirations = result.get('expirationDates', [])
+        chains = {chain['expirationDate']: self._parse_options(
+                      {'options': [chain]})
+                  for chain in result.get('options', [])}
+        with self._options_lock:
+            self._options[(symbol, None)] = (now, expirations)
+            for date, data in chains.items():
+                self._options[(symbol, date)] = (now, data)
+        return expirations, chains.get(expiration)
+
+
+    def fetch_options(self, symbol, expirations=None, nearest=None,
+                      workers=None):
+        """
+        Description:
+            Fetches the option chain of a stock, all its expirations (or
+            some) requested concurrently, see fetch_options_bulk.
+
+        Arguments:
+            symbol: stock ticker
+
+        Returns:
+            dataframe of contracts (None if fetch failed)
+        """
+        return self.fetch_options_bulk([symbol], expirations=expirations,
+                                       nearest=nearest,
+                                       workers=workers).get(symbol)
+
+
+    def fetch_options_bulk(self, symbols, expirations=None, nearest=None,
+                           workers=None):
+        """
+        Description:
+            Fetches the option chains of many stocks. Expirations of each
+            stock are listed first, then every (stock, expiration) chain
+            is fetched concurrently. Chains fetched within options_ttl
+            are returned from memory.
+
+        Arguments:
+            symbols: list of stock tickers
+
+        Keyword arguments:
+            expirations: expiration date (seconds since epoch), or list
+                         of them (default: all listed)
+            nearest: number of nearest of those expirations fetched
+                     (default: all)
+            workers: chains fetched concurrently (default: self.workers)
+
+        Notes:
+            ^symbols that fail to fetch (any of their expirations) are
+             left out of the returned dict, and the reason is recorded in
+             self.failed
+
+        Returns:
+            dict of dataframes of each symbol's contracts' expiry, type
+            (call or put), strike, bid, ask, last price, implied
+            volatility (iv), volume, and open interest
+        """
+        if type(expirations) is int:
+            expirations = [expirations]
+        if expirations is not None:
+            expirations = set(expirations)
+        expiries = lambda symbol: self._fetch_options(symbol)[0]
+        chain = lambda pair: self._fetch_options(*pair)[1]
+        self.failed = {}
+        pairs = []
+        for symbol, listed in zip(symbols,
+                                  self._map(expiries, symbols, workers)):
+            if not self._ok(symbol, listed):
+                continue
+            wanted = listed
+            if expirations is not None:
+                # In listed (nearest first) order
+                wanted = [e for e in listed if e in expirations]
+            pairs += [(symbol, e) for e in wanted[:nearest]]
+        chains = {}
+        for (symbol, expiration), result in zip(pairs,
+                                                self._map(chain, pairs,
+                                                          workers)):
+            reason = 'no chain returned for {:d}'.format(expiration)
+            if self._ok(symbol, result, reason):
+                chains.setdefault(symbol, []).append(result)
+        options = {}
+        for symbol in symbols:
+            if symbol in self.failed:
+                continue
+            frames = chains.get(symbol, [self._parse_options({})])
+            options[symbol] = pd.concat(frames, ignore_index=True)
+        return options
@@ -0,0 +1,151 @@
+"""
+yf_limiter.py
+    Contains rate_limiter, a token bucket shared between yf_fetchers so
+    that bulk downloads sustain the highest request rate Yahoo tolerates,
+    backing off when it starts answering 429 (Too Many Requests).
+"""
+import time
+import heapq
+import itertools
+import threading
+
+
+class rate_limiter:
+    """
+    Rate Limiter
+        Token bucket refilled at rate tokens per second, holding at most
+        burst tokens; each request takes one. Waiting requests are served
+        in order of priority (lowest first), then arrival. The rate is
+        halved on a throttled response (once per throttle, however many
+        requests in flight it hits) and recovers additively on every
+        successful one, up to the configured rate.
+
+    Example:
+        limiter = rate_limiter(rate=5, burst=10)
+        bulk = yf_fetcher(workers=8, limiter=limiter, priority=1)
+        interactive = yf_fetcher(limiter=limiter, priority=0)
+    """
+
+    def __init__(self, rate=2., burst=5, min_rate=0.1, recovery=1.):
+        """
+        Keyword arguments:
+            rate: most requests per second (default: 2)
+            burst: requests that can be sent at once after idling
+            min_rate: rate is never lowered below (requests per second)
+            recovery: requests per second the rate regains per second of
+                      successful requests
+        """
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._halved = -float('inf')
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        return
+
+
+    def __getstate__(self):
+        # Waiters and the lock stay with this process, a copy (e.g., in a
+        # worker process) is a limiter of its own with the same settings
+        state = dict(self.__dict__)
+        for name in ('_queue', '_order', '_cond', '_stamp', '_halved'):
+            del state[name]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Monotonic clocks of processes aren't comparable, restart them
+        self._stamp = time.monotonic()
+        self._halved = -float('inf')
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        return
+
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens+(now-self._stamp)*self.rate)
+        self._stamp = now
+        return
+
+
+    def acquire(self, priority=0):
+        """
+        Description:
+            Blocks until a token is free and no request of higher priority
+            (or equal priority that arrived earlier) is waiting.
+
+        Keyword arguments:
+            priority: lower priorities are served first (default: 0)
+
+        Returns:
+            seconds waited
+        """
+        t0 = time.monotonic()
+        with self._cond:
+            entry = (priority, next(self._order))
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._queue[0] == entry and self.tokens >= 1:
+                        self.tokens -= 1
+                        heapq.heappop(self._queue)
+                        self._cond.notify_all()
+                        return time.monotonic()-t0
+                    # Only the head knows how long until its token, the
+                    # rest wait to become the head
+                    timeout = None
+                    if self._queue[0] == entry:
+                        timeout = (1-self.tokens)/self.rate
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+
+
+    def throttled(self, delay=None):
+        """
+        Description:
+            Halves the rate after a throttled response, and empties the
+            bucket so no request is sent for at least delay seconds.
+
+        Keyword arguments:
+            delay: seconds the server asked to wait, e.g., Retry-After
+        """
+        with self._cond:
+            self._refill()
+            # Requests in flight when throttled are rejected together,
+            # only halve again once requests sent at the new rate are
+            if self._stamp-self._halved >= max(delay or 0., 1/self.rate):
+                self.rate = max(self.min_rate, self.rate/2)
+                self._halved = self._stamp
+            # Negative tokens are a debt paid off at the new rate
+            self.tokens = min(self.tokens, 0.)
+            if delay is not None:
+                self.tokens = min(self.tokens, -delay*self.rate)
+            self._cond.notify_all()
+        return
+
+
+    def succeeded(self):
+        """
+        Description:
+            Regains rate after a successful response.
+        """
+        with self._cond:
+            if self.rate < self.max_rate:
+                self._refill()
+                # A second's worth of successes regains recovery
+                self.rate = min(self.max_rate,
+                                self.rate+self.recovery/self.rate)
+        return
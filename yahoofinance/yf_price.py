@@ -3,17 +3,33 @@ yf_price.py
     Contains price_data which is the object that contains the price data
     and contains analysis methods.
 """
+import functools
 import numpy as np
 import pandas as pd
 
 from yf_fetcher import yf_fetcher
+from yf_calendar import exchange_calendar
+from yf_rolling import rolling_mean
 from utils import *
-from plot_utils import candlestick
+
+
+def _staged(method):
+    """
+    Description:
+        Decorates a price_data method so its time is recorded as a stage,
+        named after the method, in the fetcher's stats (if set).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.fethcer._stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class price_data:
     def __init__(self, symbols, period1, period2, interval,
-                 PrePost=False, div=False, split=False):
+                 PrePost=False, div=False, split=False, fetcher=None,
+                 panel=False):
         """
         Description:
             Fetches the price data from yahoo finance and returns the
@@ -31,6 +47,16 @@ class price_data:
             PrePost: include pre and post market data (boolean)
             div: include dividend data (boolean)
             split: include split data (boolean)
+            fetcher: yf_fetcher used to fetch prices, e.g., one with a
+                     price_cache (default: yf_fetcher())
+            panel: store multiple securities as one panel dataframe
+                   (boolean)
+
+        Notes:
+            ^a panel is a single dataframe indexed by the union of all
+             symbols' times, with (symbol, variable) columns. Indicators
+             are then calculated across all symbols at once, but a bar
+             missing for one symbol is a NaN row for that symbol.
         """
         if (type(symbols) is list and
             all(type(symbol) is str for symbol in symbols)):
@@ -44,17 +70,185 @@ class price_data:
         self.PrePost = PrePost
         self.div = div
         self.split = split
-        self.fethcer = yf_fetcher()
+        self.fethcer = yf_fetcher() if fetcher is None else fetcher
         self.meta, self.data = self.fethcer.fetch_price_history(
             symbols, period1, period2, interval,
             PrePost=PrePost, div=div, split=split
         )
+        self.panel = panel and self.multiple
+        if self.panel:
+            self.data = self._to_panel(self.data)
         self.pivot_meta, self.pivot_data = None, None
+        self._indicators = {}
         self.ddt = pd.to_timedelta(self.fethcer._seconds_in_interval[interval],
                                    unit='s')
         return
 
 
+    @staticmethod
+    def _to_panel(data):
+        """
+        Description:
+            Joins a dict of per symbol dataframes into a panel, a single
+            dataframe with (symbol, variable) columns.
+        """
+        if not data:
+            return pd.DataFrame(columns=pd.MultiIndex.from_tuples([]))
+        return pd.concat(data, axis=1).sort_index()
+
+
+    def _frames(self, data):
+        """
+        Description:
+            Iterates over the per symbol dataframes of price data, whether
+            stored as a single dataframe, a dict of dataframes, or a panel.
+
+        Returns:
+            generator of (symbol, dataframe) tuples
+        """
+        if type(data) is dict:
+            yield from data.items()
+        elif isinstance(data.columns, pd.MultiIndex):
+            for sym in data.columns.unique(level=0):
+                yield sym, data[sym].dropna(how='all')
+        else:
+            yield self.symbols, data
+
+
+    def _compute(self, data, func, *var):
+        """
+        Description:
+            Calculates func(*var) over price data. For a panel func is
+            called once with (bars x symbols) dataframes of var, so the
+            calculation is vectorized over all symbols.
+
+        Arguments:
+            data: price data (dataframe, dict of dataframes, or panel)
+            func: function of series (or dataframes) of var
+            var: variables passed to func
+
+        Returns:
+            result (series, dict of series, or dataframe for a panel)
+        """
+        if type(data) is dict:
+            return {sym: func(*[data[sym][v] for v in var]) for sym in data}
+        elif isinstance(data.columns, pd.MultiIndex):
+            return func(*[data.xs(v, axis=1, level=1) for v in var])
+        return func(*[data[v] for v in var])
+
+
+    def _combine(self, func, *results):
+        """
+        Description:
+            Calculates func of results of _compute, e.g., a difference.
+        """
+        if type(results[0]) is dict:
+            return {sym: func(*[r[sym] for r in results])
+                    for sym in results[0]}
+        return func(*results)
+
+
+    def _assign(self, data, name, result):
+        """
+        Description:
+            Adds result of _compute as column name to price data.
+
+        Returns:
+            price data with column added
+        """
+        if data is self.data:
+            # Cached indicators of the overwritten column are stale
+            self._indicators = {k: v for k, v in self._indicators.items()
+                                if k[1] != name}
+        if type(data) is dict:
+            for sym in data:
+                data[sym][name] = self._cast(result[sym])
+        elif isinstance(data.columns, pd.MultiIndex):
+            result = self._cast(result)
+            variables = data.columns.unique(level=1)
+            if 'close' in variables:
+                # No indicator values at bars a symbol is missing
+                present = data.xs('close', axis=1, level=1).reindex(
+                    index=result.index, columns=result.columns).notna()
+                result = result.where(present.to_numpy())
+            result.columns = pd.MultiIndex.from_product([result.columns,
+                                                         [name]])
+            if name in variables:
+                data = data.drop(columns=name, level=1)
+            data = pd.concat([data, result], axis=1)
+            data = data.reindex(columns=data.columns.unique(level=0),
+                                level=0)
+        else:
+            data[name] = self._cast(result)
+        return data
+
+
+    def _apply(self, data, name, func, *var):
+        """
+        Description:
+            Adds column name = func(*var) to price data, see _compute.
+
+        Returns:
+            price data with column added
+        """
+        return self._assign(data, name, self._compute(data, func, *var))
+
+
+    def _memo(self, key, func, *var):
+        """
+        Description:
+            Lazily calculates func(*var) over the price data, caching the
+            result so other indicators reuse it rather than recalculate.
+
+        Arguments:
+            key: (indicator, variable, parameters...) tuple of result
+            func: function of series (or dataframes) of var
+            var: variables passed to func
+
+        Returns:
+            result (series, dict of series, or dataframe for a panel)
+        """
+        if key not in self._indicators:
+            self.fethcer._count('indicator_cache_misses')
+            self._indicators[key] = self._compute(self.data, func, *var)
+        else:
+            self.fethcer._count('indicator_cache_hits')
+        return self._indicators[key]
+
+
+    def _EWM(self, var, span):
+        # Bars a symbol of a panel is missing don't count towards decay
+        return self._memo(('EMA', var, span),
+                          lambda x: x.ewm(span=span, ignore_na=True).mean(),
+                          var)
+
+
+    def clear_cache(self):
+        """
+        Description:
+            Empties the cache of intermediate indicator results, needed if
+            the price data is modified outside of price_data's methods.
+        """
+        self._indicators = {}
+        return
+
+
+    def _cast(self, result):
+        """
+        Description:
+            Casts float indicator results to the fetcher's price dtype.
+        """
+        dtype = self.fethcer.dtypes['price']
+        if isinstance(result, pd.DataFrame):
+            dtypes = {c: dtype for c, t in result.dtypes.items()
+                      if t.kind == 'f' and t != dtype}
+            return result.astype(dtypes) if dtypes else result
+        if result.dtype.kind == 'f':
+            return result.astype(dtype)
+        return result
+
+
+    @_staged
     def OBV(self, normalize=True):
         """
         Description:
@@ -66,39 +260,52 @@ class price_data:
         Reference:
             https://www.investopedia.com/terms/o/onbalancevolume.asp
         """
-        if self.multiple:
-            for sym in self.symbols:
-                self.data[sym]['OBV'] = np.zeros(len(self.data[sym]))
-                yesterday_close = self.data[sym]['close'].iloc[0]
-                for d, date in enumerate(self.data[sym].index[1:], start=1):
-                    self.data[sym]['OBV'].iat[d] = (
-                        self.data[sym]['OBV'].iloc[d-1])
-                    if self.data[sym]['close'].iloc[d] > yesterday_close:
-                        self.data[sym]['OBV'].iat[d] += (
-                            self.data[sym]['volume'].iloc[d])
-                    elif self.data[sym]['close'].iloc[d] < yesterday_close:
-                        self.data[sym]['OBV'].iat[d] -= (
-                            self.data[sym]['volume'].iloc[d])
-                if normalize:
-                    self.data[sym]['OBV'] /= self.data[sym].OBV.abs().max()
-        else:
-            self.data['OBV'] = np.zeros(len(self.data))
-            yesterday_close = self.data['close'].iloc[0]
-            for d, date in enumerate(self.data.index[1:], start=1):
-                self.data['OBV'].iat[d] = self.data['OBV'].iloc[d-1]
-                if self.data['close'].iloc[d] > yesterday_close:
-                    self.data['OBV'].iat[d] += self.data['volume'].iloc[d]
-                elif self.data['close'].iloc[d] < yesterday_close:
-                    self.data['OBV'].iat[d] -= self.data['volume'].iloc[d]
-            if normalize:
-                self.data['OBV'] /= self.data.OBV.abs().max()
+        self.data = self._apply(
+            self.data, 'OBV',
+            lambda close, volume: self._OBV(close, volume,
+                                            normalize=normalize),
+            'close', 'volume'
+        )
         return
 
 
+    @staticmethod
+    def _OBV(close, volume, normalize=True):
+        """
+        Description:
+            Vectorized OBV, the cumulative sum of volume signed by the
+            direction of the close price change from the previous bar.
+            Works on series, or on frames with one column per symbol.
+        """
+        # Changes are from the previous bar present, skipping missing bars
+        direction = np.sign(close.astype(float).ffill().diff()).fillna(0)
+        obv = (direction*volume.astype(float)).cumsum()
+        if normalize:
+            obv /= obv.abs().max()
+        return obv
+
+
+    @staticmethod
+    def _column(indicator, parameter, var, win_type=None):
+        """
+        Description:
+            Name of an indicator's column with its parameter, e.g., MA20,
+            EMA12_volume, or MA20_gaussian.
+        """
+        name = indicator+str(parameter)
+        if win_type is not None:
+            name += '_'+win_type
+        if var != 'close':
+            name += '_'+var
+        return name
+
+
+    @_staged
     def MA(self, window, var='close', win_type=None, **win_kwargs):
         """
         Description:
-            Moving Average (MA) is added to dataframe.
+            Moving Average (MA) is added to dataframe, as MA and as MA with
+            the window in its name (e.g., MA20) so multiple windows coexist.
 
         Arguments:
             window: number of lagging points used in average
@@ -107,23 +314,32 @@ class price_data:
             var: variable to calcualte MA
             win_type: scipy window type (None is Simple Moving Average)
             win_kwargs: arguments for window type
+
+        Notes:
+            ^a panel's symbols are averaged together as one matrix, over
+             each symbol's own bars (bars it is missing are skipped)
         """
         self.MA_window = window
-        if self.multiple:
-            for sym in self.symbols:
-                self.data[sym]['MA'] = (
-                    self.data[sym][var].rolling(window, win_type=win_type)
-                    .mean(**win_kwargs))
-        else:
-            self.data['MA'] = self.data[var].rolling(
-                window, win_type=win_type).mean(**win_kwargs)
+        key = ('MA', var, window, win_type, tuple(sorted(win_kwargs.items())))
+        result = self._memo(
+            key,
+            lambda x: rolling_mean(x, window, win_type=win_type,
+                                   **win_kwargs),
+            var
+        )
+        name = self._column('MA', window, var, win_type=win_type)
+        self.data = self._assign(self.data, name, result)
+        self.data = self._assign(self.data, 'MA', result)
         return
 
 
+    @_staged
     def EMA(self, span, var='close'):
         """
         Description:
-            Exponential Moving Average (EMA) is added to dataframe.
+            Exponential Moving Average (EMA) is added to dataframe, as EMA
+            and as EMA with the span in its name (e.g., EMA12) so multiple
+            spans coexist.
 
         Arguments:
             span: smoothing factor is 2/(span+1)
@@ -132,15 +348,14 @@ class price_data:
             var: variable to calcualte EMA
         """
         self.EMA_span = span
-        if self.multiple:
-            for sym in self.symbols:
-                self.data[sym]['EMA'] = (
-                    self.data[sym][var].ewm(span=span).mean())
-        else:
-            self.data['EMA'] = self.data[var].ewm(span=span).mean()
+        result = self._EWM(var, span)
+        name = self._column('EMA', span, var)
+        self.data = self._assign(self.data, name, result)
+        self.data = self._assign(self.data, 'EMA', result)
         return
 
 
+    @_staged
     def MACD(self, short_span=12, long_span=26, signal_span=9, normalize=True):
         """
         Description:
@@ -154,58 +369,46 @@ class price_data:
 
         Notes:
             ^smoothing factor of EMA is 2/(span+1)
+            ^EMAs of close already calculated (e.g., by EMA) are reused
 
         Reference:
             https://www.investopedia.com/terms/m/macd.asp
         """
-        if self.multiple:
-            for sym in self.symbols:
-                self.data[sym]['MACD'] = (
-                    self.data[sym]['close'].ewm(span=short_span).mean()
-                    -self.data[sym]['close'].ewm(span=long_span).mean()
-                )
-                self.data[sym]['MACD_EMA'+str(signal_span)] = (
-                    self.data[sym]['MACD'].ewm(span=signal_span).mean())
-                self.data[sym]['MACD_sig'] = (
-                    self.data[sym]['MACD']
-                    -self.data[sym]['MACD_EMA'+str(signal_span)])
-                if normalize:
-                    self.data[sym]['MACD_sig'] /= (
-                        self.data[sym].MACD_sig.abs().max())
-        else:
-            self.data['MACD'] = (self.data['close'].ewm(span=short_span).mean()
-                                 -self.data['close'].ewm(span=long_span).mean())
-            self.data['MACD_EMA'+str(signal_span)] = (
-                self.data['MACD'].ewm(span=signal_span).mean())
-            self.data['MACD_sig'] = (self.data['MACD']
-                                     -self.data['MACD_EMA'+str(signal_span)])
+        signal = 'MACD_EMA'+str(signal_span)
+        macd = self._combine(lambda short, long: short-long,
+                             self._EWM('close', short_span),
+                             self._EWM('close', long_span))
+        self.data = self._assign(self.data, 'MACD', macd)
+        self.data = self._assign(self.data, signal,
+                                 self._EWM('MACD', signal_span))
+        def MACD_sig(macd, ema):
+            sig = macd-ema
             if normalize:
-                self.data['MACD_sig'] /= self.data.MACD_sig.abs().max()
+                sig /= sig.abs().max()
+            return sig
+        self.data = self._apply(self.data, 'MACD_sig', MACD_sig,
+                                'MACD', signal)
         return
 
 
+    @_staged
     def ROI(self):
         """
         Description:
             Return On Investment (ROI) added to dataframe. Assumes zero
             commission.
         """
-        if self.multiple:
-            for sym in self.symbols:
-                if 'adjclose' in self.data[sym].columns:
-                    self.data[sym]['ROI'] = (
-                        self.data[sym].close/self.data[sym].adjclose[0]-1)
-                else:
-                    self.data[sym]['ROI'] = (
-                        self.data[sym].close/self.data[sym].close[0]-1)
-        else:
-            if 'adjclose' in self.data.columns:
-                self.data['ROI'] = self.data.close/self.data[sym].adjclose[0]-1
-            else:
-                self.data['ROI'] = self.data.close/self.data.close[0]-1
+        df = next(self._frames(self.data))[1]
+        base = 'adjclose' if 'adjclose' in df.columns else 'close'
+        self.data = self._apply(
+            self.data, 'ROI',
+            lambda close, base: close/base.bfill().iloc[0]-1,
+            'close', base
+        )
         return
 
 
+    @_staged
     def RC(self, var='close'):
         """
         Description:
@@ -215,26 +418,159 @@ class price_data:
         Keyword arguments:
             var: variable to calcualte RC
         """
-        if self.multiple:
-            key = list(self.meta.keys())[0]
-            var_i = list(self.data[key].columns).index(var)
-            for sym in self.symbols:
-                self.data[sym]['RC'] = (
-                    [0]+list((self.data[sym].iloc[1:,var_i].values
-                              -self.data[sym].iloc[:-1,var_i].values)
-                             /self.data[sym].iloc[1:,var_i].values)
-                )
-        else:
-            var_i = list(self.data.columns).index(var)
-            self.data['RC'] = (
-                [0]+list((self.data.iloc[1:,var_i].values
-                          -self.data.iloc[:-1,var_i].values)
-                         /self.data.iloc[1:,var_i].values)
-            )
+        def RC(x):
+            rc = x.ffill().diff()/x
+            rc.iloc[0] = 0
+            # First bar of each symbol, also in panels of later starts
+            valid = x.notna()
+            return rc.mask(valid & (valid.cumsum() == 1), 0)
+        self.data = self._apply(self.data, 'RC', RC, var)
         return
 
 
-    def pivot_points(self, pivot_interval=None, pivot_kind='HLC'):
+    # Pandas resampling rules matching YF's bars of each interval
+    _resample_rules = {'1d':'D', '1wk':'W-MON', '1mo':'MS', '3mo':'QS'}
+    _resample_agg = {'open':'first', 'close':'last', 'adjclose':'last',
+                     'low':'min', 'high':'max', 'volume':'sum'}
+
+
+    def _resample(self, df, interval, meta):
+        """
+        Description:
+            Aggregates bars of df into bars of a longer interval. Subday
+            bars are aligned to the exchange's regular session open, and
+            weekly bars start on Monday like YF's.
+
+        Arguments:
+            df: dataframe of bars
+            interval: one of YF's data intervals, e.g., '1wk'
+            meta: meta data of df's symbol
+
+        Returns:
+            dataframe of resampled bars
+        """
+        agg = {c: a for c, a in self._resample_agg.items() if c in df}
+        tz = df.index.tz
+        if tz is not None:
+            # Bin in exchange time, so days start at the exchange's midnight
+            df = df.tz_convert(meta['exchangeTimezoneName'])
+        if interval in self._resample_rules:
+            if self.PrePost:
+                # YF's daily and longer bars span regular sessions only
+                df = df[self._regular_session(df.index, meta)]
+            resampler = df.resample(self._resample_rules[interval],
+                                    label='left', closed='left')
+        else:
+            seconds = self.fethcer._seconds_in_interval[interval]
+            offset = pd.Timedelta(0)
+            regular = meta.get('currentTradingPeriod', {}).get('regular')
+            if regular is not None:
+                start = UT_to_DTI([regular['start']],
+                                  timezone=meta['exchangeTimezoneName'])[0]
+                offset = start-start.normalize()
+            resampler = df.resample('{:d}min'.format(seconds//60),
+                                    origin='start_day', offset=offset,
+                                    label='left', closed='left')
+        # Bins without any bars (e.g., overnight) are dropped
+        bars = resampler.agg(agg).dropna(subset=['close'])
+        if tz is not None:
+            bars = bars.tz_convert(tz)
+        return bars
+
+
+    def _regular_session(self, index, meta):
+        """
+        Arguments:
+            index: DatetimeIndex of bars in exchange time (or naive)
+            meta: meta data of the bars' symbol
+
+        Returns:
+            boolean array of whether bars start within a regular session,
+            all True if the session isn't known
+        """
+        wall = index.tz_localize(None) if index.tz is not None else index
+        cal = self._calendar(meta)
+        if cal is not None:
+            try:
+                # Early closes and holidays included
+                return ((wall >= cal.session_open(wall)) &
+                        (wall < cal.session_close(wall)))
+            except ValueError:
+                pass
+        regular = meta.get('currentTradingPeriod', {}).get('regular')
+        if regular is None:
+            return np.ones(len(index), dtype=bool)
+        start, end = UT_to_DTI([regular['start'], regular['end']],
+                               timezone=meta['exchangeTimezoneName'])
+        time = wall-wall.normalize()
+        return ((time >= start-start.normalize()) &
+                (time < end-end.normalize()))
+
+
+    @staticmethod
+    def _calendar(*metas):
+        """
+        Returns:
+            trading_calendar shared by the exchanges of metas, or None if
+            they have none or differ
+        """
+        try:
+            cals = {exchange_calendar(meta['exchangeName'])
+                    for meta in metas}
+        except (KeyError, ValueError):
+            return None
+        return cals.pop() if len(cals) == 1 else None
+
+
+    def _resample_pivot_data(self):
+        """
+        Description:
+            Builds pivot bars from the already fetched price data.
+
+        Returns:
+            tuple of meta data, and pivot bars (None, None if the price
+            data doesn't cover the period, e.g., YF truncated history)
+        """
+        s2i_dict = self.fethcer._seconds_in_interval
+        if (self.pivot_interval not in self._resample_rules and
+            self.pivot_interval not in self.fethcer._valid_subday_intervals):
+            return None, None
+        if s2i_dict[self.pivot_interval] <= s2i_dict[self.interval]:
+            return None, None
+        meta = self.meta if self.multiple else {self.symbols: self.meta}
+        pivot_data = {}
+        for sym, df in self._frames(self.data):
+            if not len(df):
+                return None, None
+            tz = meta[sym]['exchangeTimezoneName']
+            first = DTI_to_UT(df.index[:1], timezone=tz)[0]
+            cal = self._calendar(meta[sym])
+            expected = None
+            if cal is not None:
+                # period1 may be after its session closed, so allow the
+                # first bar to be on the following session
+                try:
+                    expected = cal.shift(
+                        UT_to_DTI([self.period1], timezone=tz), 1)[0]
+                except ValueError:
+                    pass
+            if expected is not None:
+                day = UT_to_DTI([first], timezone=tz, normalize=True)[0]
+                if day > expected:
+                    return None, None
+            # Without a calendar allow a lag of a weekend and holiday
+            elif first-self.period1 > s2i_dict[self.pivot_interval]+4*86400:
+                return None, None
+            pivot_data[sym] = self._resample(df, self.pivot_interval,
+                                             meta[sym])
+        if not self.multiple:
+            return self.meta, pivot_data[self.symbols]
+        return self.meta, pivot_data
+
+
+    @_staged
+    def pivot_points(self, pivot_interval=None, pivot_kind='HLC',
+                     resample=False):
         """
         Description:
             7-point pivot system is calculated based on pivoting interval.
@@ -245,6 +581,9 @@ class price_data:
         Keyword arguments:
             pivot_interval: Set the interval used for pivot calualtion
             pivot_kind: String of variables averaged for pivot point
+            resample: build pivot bars by resampling the price data, only
+                      fetching them if the price data doesn't cover the
+                      period (boolean)
 
         Notes:
             ^pivot_kind string uses: H = high, L = low, O = open,
@@ -259,7 +598,7 @@ class price_data:
                 self.pivot_ddt = pd.to_timedelta(1, unit='w')
             elif self.interval in self.fethcer._valid_submonth_intervals:
                 self.pivot_interval = '1mo'
-                self.pivot_ddt = pd.to_timedelta(30, unit='d') # Ehh
+                self.pivot_ddt = pd.DateOffset(months=1)
             else:
                 print('ERROR: Month interval and longer have no default '
                       'pivot interval.\n'
@@ -274,78 +613,65 @@ class price_data:
             if s2i_dict[pivot_interval] <= s2i_dict[self.interval]:
                 print('WARNING: Pivot interval shorter than data interval.')
             self.pivot_interval = pivot_interval
-            self.pivot_ddt = pd.to_timedelta(s2i_dict[pivot_interval], unit='s')
+            if pivot_interval in ['1mo', '3mo']:
+                self.pivot_ddt = pd.DateOffset(months=int(pivot_interval[0]))
+            else:
+                self.pivot_ddt = pd.to_timedelta(s2i_dict[pivot_interval],
+                                                 unit='s')
         # Grab pivot data
-        self.pivot_meta, self.pivot_data = self.fethcer.fetch_price_history(
-            self.symbols, self.period1, self.period2, self.pivot_interval,
-            PrePost=self.PrePost, div=self.div, split=self.split
-        )
+        self.pivot_meta, self.pivot_data = None, None
+        if resample:
+            self.pivot_meta, self.pivot_data = self._resample_pivot_data()
+        if self.pivot_data is None:
+            self.pivot_meta, self.pivot_data = (
+                self.fethcer.fetch_price_history(
+                    self.symbols, self.period1, self.period2,
+                    self.pivot_interval, PrePost=self.PrePost, div=self.div,
+                    split=self.split
+                )
+            )
+        if self.panel:
+            self.pivot_data = self._to_panel(self.pivot_data)
         self.pivot_kind = pivot_kind
         self.pivot_dict = {'H':'high', 'h':'high', 'L':'low', 'l':'low',
                            'O':'open', 'o':'open', 'C':'close', 'c':'close'}
-        
-        if self.multiple:
-            for sym in self.symbols:
-                self.pivot_data[sym]['pivot'] = np.zeros(len(self.pivot_data[sym]))
-                for c in self.pivot_kind:
-                    self.pivot_data[sym]['pivot'] += (
-                        self.pivot_data[sym][self.pivot_dict[c]])
-                self.pivot_data[sym]['pivot'] /= len(self.pivot_kind)
-                # Prediction times
-                t1 = self.pivot_data[sym].index[-1]+self.pivot_ddt
-                t2 = t1+self.pivot_ddt
-                self.pivot_data[sym]['start'] = (
-                    (self.pivot_data[sym].index[1:].append(
-                        pd.DatetimeIndex([t1])))
-                )
-                self.pivot_data[sym]['end'] = (
-                    (self.pivot_data[sym].index[2:]).append(
-                        pd.DatetimeIndex([t1, t2]))
-                )
-                self.pivot_data[sym]['S1'] = (2*self.pivot_data[sym]['pivot']
-                                              -self.pivot_data[sym]['high'])
-                self.pivot_data[sym]['S2'] = (self.pivot_data[sym]['pivot']
-                                              +self.pivot_data[sym]['low']
-                                              -self.pivot_data[sym]['high'])
-                self.pivot_data[sym]['S3'] = (self.pivot_data[sym]['S1']
-                                              +self.pivot_data[sym]['low']
-                                              -self.pivot_data[sym]['high'])
-                self.pivot_data[sym]['R1'] = (2*self.pivot_data[sym]['pivot']
-                                              -self.pivot_data[sym]['low'])
-                self.pivot_data[sym]['R2'] = (self.pivot_data[sym]['pivot']
-                                              -self.pivot_data[sym]['low']
-                                              +self.pivot_data[sym]['high'])
-                self.pivot_data[sym]['R3'] = (self.pivot_data[sym]['R1']
-                                              -self.pivot_data[sym]['low']
-                                              +self.pivot_data[sym]['high'])
-        else:
-            self.pivot_data['pivot'] = np.zeros(len(self.pivot_data))
-            for c in self.pivot_kind:
-                self.pivot_data['pivot'] += self.pivot_data[self.pivot_dict[c]]
-            self.pivot_data['pivot'] /= len(self.pivot_kind)
-            # Prediction times
-            t1 = self.pivot_data.index[-1]+self.pivot_ddt
-            t2 = t1+self.pivot_ddt
-            self.pivot_data['start'] = (self.pivot_data.index[1:]).append(
-                pd.DatetimeIndex([t1]))
-            self.pivot_data['end'] = (self.pivot_data.index[2:]).append(
-                pd.DatetimeIndex([t1, t2]))
-            self.pivot_data['S1'] = (2*self.pivot_data['pivot']
-                                     -self.pivot_data['high'])
-            self.pivot_data['S2'] = (self.pivot_data['pivot']
-                                     +self.pivot_data['low']
-                                     -self.pivot_data['high'])
-            self.pivot_data['S3'] = (self.pivot_data['S1']
-                                     +self.pivot_data['low']
-                                     -self.pivot_data['high'])
-            self.pivot_data['R1'] = (2*self.pivot_data['pivot']
-                                     -self.pivot_data['low'])
-            self.pivot_data['R2'] = (self.pivot_data['pivot']
-                                     -self.pivot_data['low']
-                                     +self.pivot_data['high'])
-            self.pivot_data['R3'] = (self.pivot_data['R1']
-                                     -self.pivot_data['low']
-                                     +self.pivot_data['high'])
+        kind = [self.pivot_dict[c] for c in self.pivot_kind]
+        # Daily pivots of the last bars apply over the next sessions
+        metas = (self.pivot_meta.values() if self.multiple
+                 else [self.pivot_meta])
+        cal = self._calendar(*metas) if self.pivot_interval == '1d' else None
+        # Prediction times, each pivot is applied over the following period
+        def times(x, lead):
+            last = x.index[-1:]
+            t1 = last[0]+self.pivot_ddt
+            after = pd.DatetimeIndex([t1, t1+self.pivot_ddt])
+            if cal is not None:
+                try:
+                    after = cal.shift(last, 1).append(cal.shift(last, 2))
+                    if last.tz is not None:
+                        after = after.tz_localize(cal.timezone).tz_convert(
+                            last.tz)
+                except ValueError:
+                    pass
+            t = x.index.append(after)
+            t = t[lead:lead+len(x)]
+            if isinstance(x, pd.DataFrame):
+                return pd.DataFrame({c: t for c in x.columns}, index=x.index)
+            return pd.Series(t, index=x.index)
+        apply = lambda *args: self._apply(self.pivot_data, *args)
+        self.pivot_data = apply('pivot', lambda *x: sum(x)/len(x), *kind)
+        self.pivot_data = apply('start', lambda x: times(x, 1), 'pivot')
+        self.pivot_data = apply('end', lambda x: times(x, 2), 'pivot')
+        self.pivot_data = apply('S1', lambda p, h: 2*p-h, 'pivot', 'high')
+        self.pivot_data = apply('S2', lambda p, l, h: p+l-h,
+                                'pivot', 'low', 'high')
+        self.pivot_data = apply('S3', lambda s1, l, h: s1+l-h,
+                                'S1', 'low', 'high')
+        self.pivot_data = apply('R1', lambda p, l: 2*p-l, 'pivot', 'low')
+        self.pivot_data = apply('R2', lambda p, l, h: p-l+h,
+                                'pivot', 'low', 'high')
+        self.pivot_data = apply('R3', lambda r1, l, h: r1-l+h,
+                                'R1', 'low', 'high')
         return
 
 
@@ -368,17 +694,16 @@ class price_data:
             ^var can be 'candle' to plot a candle plot with low/high wicks
              and open/close body
         """
+        # Matplotlib is only imported once plotting, not by analysis workers
+        from plot_utils import candlestick, dates_to_x
         # Plot with pandas dataframe plot method
         if var == 'candle':
-            if self.multiple:
-                for sym in self.symbols:
-                    candlestick(ax, self.data[sym], self.ddt, **kwargs)
-            else:
-                candlestick(ax, self.data, self.ddt, **kwargs)
+            for sym, df in self._frames(self.data):
+                candlestick(ax, df, self.ddt, **kwargs)
         else:
             if self.multiple:
-                for sym in self.symbols:
-                    self.data[sym][var].plot(ax=ax, label=sym, **kwargs)
+                for sym, df in self._frames(self.data):
+                    df[var].plot(ax=ax, label=sym, **kwargs)
             else:
                 self.data[var].plot(ax=ax, **kwargs)
         # If currency based variable add currency ylabel
@@ -400,18 +725,15 @@ class price_data:
                 return
             color_r = ['#fb6a4a', '#de2d26', '#a50f15']
             color_s = ['#74c476', '#31a354', '#006d2c']
-            df = self.pivot_data
-            for start, end, sup, res in zip(df.start, df.end,
-                                            zip(df.S1, df.S2, df.S3),
-                                            zip(df.R1, df.R2, df.R3)):
-                for i, s in enumerate(sup):
-                    if i < npivots:
-                        ax.hlines(s, start, end, lw=1, color=color_s[i],
-                                  alpha=1, zorder=-1)
-                for i, r in enumerate(res):
-                    if i < npivots:
-                        ax.hlines(r, start, end, lw=1, color=color_r[i],
-                                  alpha=1, zorder=-1)
+            # One collection per support/resistance level for all symbols,
+            # x in the axis' units so lines land on pandas' period axes
+            df = pd.concat([df for sym, df in self._frames(self.pivot_data)])
+            df = df.dropna(subset=['start', 'end'])
+            start, end = dates_to_x(ax, df.start), dates_to_x(ax, df.end)
+            for i in range(min(npivots, 3)):
+                for level, color in [('S', color_s[i]), ('R', color_r[i])]:
+                    ax.hlines(df[level+str(i+1)].to_numpy(float), start, end,
+                              lw=1, color=color, alpha=1, zorder=-1)
         # Fix up x-axis dates nicely
         fig.autofmt_xdate()
         return
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+yf_rolling.py
+    Contains rolling_mean, a moving average over a (bars x symbols)
+    matrix computed for all symbols at once; cumulative sums for simple
+    averages and FFT convolution for weighted (scipy) windows.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _compact(x):
+    """
+    Description:
+        Moves each column's values to the top, missing values (NaN) to the
+        bottom, keeping order, in O(bars x symbols).
+
+    Returns:
+        tuple of compacted matrix, rows the values were moved to, and
+        number of values of each column
+    """
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=0)
+    rank = np.where(valid, np.cumsum(valid, axis=0)-1,
+                    count+np.cumsum(~valid, axis=0)-1)
+    compact = np.empty_like(x)
+    np.put_along_axis(compact, rank, x, axis=0)
+    return compact, rank, count
+
+
+def _contiguous(x):
+    """
+    Returns:
+        whether the values of each column are contiguous, i.e., x has
+        only leading and trailing NaN
+    """
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=0)
+    first = valid.argmax(axis=0)
+    last = len(x)-valid[::-1].argmax(axis=0)
+    return bool(np.all((count == 0) | (last-first == count)))
+
+
+def _window_mean(x, window, weights=None):
+    """
+    Returns:
+        (bars-window+1 x symbols) matrix of the means of full windows of
+        x, which has no missing values above each column's count
+    """
+    # Centering each column keeps cumulative sums and FFTs accurate
+    invalid = np.isnan(x)
+    first = (~invalid).argmax(axis=0)
+    center = np.nan_to_num(x[first, np.arange(x.shape[1])])
+    y = np.subtract(x, center)
+    if invalid.any():
+        y[invalid] = 0.
+    if weights is None:
+        np.cumsum(y, axis=0, out=y)
+        sums = np.empty((len(y)-window+1, y.shape[1]), order='F')
+        sums[0] = y[window-1]
+        np.subtract(y[window:], y[:-window], out=sums[1:])
+        sums /= window
+        sums += center
+        return sums
+    from scipy.signal import fftconvolve
+    # Convolution flips the kernel, pandas' windows are oldest value first
+    kernel = (weights/weights.sum())[::-1, None]
+    return fftconvolve(y, kernel, mode='valid', axes=0)+center
+
+
+def rolling_mean(x, window, win_type=None, **win_kwargs):
+    """
+    Description:
+        Moving average of each column over its last window values, like
+        pandas' rolling(window, win_type).mean(**win_kwargs) of each
+        symbol's own bars. Missing values (NaN), e.g., bars a symbol of a
+        panel didn't trade, are skipped rather than spoiling the windows
+        they fall in.
+
+    Arguments:
+        x: (bars x symbols) array or dataframe, or series of bars
+        window: number of lagging values averaged
+
+    Keyword arguments:
+        win_type: scipy window type (None is Simple Moving Average)
+        win_kwargs: arguments for window type, e.g., std of gaussian
+
+    Returns:
+        moving averages, same shape and type as x (NaN until a column
+        has window values)
+    """
+    values = np.asarray(x, dtype=np.float64)
+    # Columns contiguous in memory, as pandas stores them, so the passes
+    # down each column are sequential
+    matrix = np.asfortranarray(values.reshape(len(values), -1))
+    weights = None
+    if win_type is not None:
+        from scipy.signal import windows
+        weights = getattr(windows, win_type)(window, **win_kwargs)
+    result = np.full(matrix.shape, np.nan, order='F')
+    if len(matrix) < window:
+        pass
+    elif _contiguous(matrix):
+        # Only leading or trailing NaN, which spoil no full window
+        result[window-1:] = _window_mean(matrix, window, weights)
+        invalid = np.isnan(matrix)
+        if invalid.any():
+            # Windows touching a NaN have fewer than window values
+            total = np.cumsum(invalid, axis=0)
+            total[window:] -= total[:-window].copy()
+            result[total > 0] = np.nan
+    else:
+        compact, rank, count = _compact(matrix)
+        mean = np.full(matrix.shape, np.nan, order='F')
+        mean[window-1:] = _window_mean(compact, window, weights)
+        # Windows running into the missing values moved to the bottom
+        mean[np.arange(len(mean))[:, None] >= count] = np.nan
+        result = np.take_along_axis(mean, rank, axis=0)
+    result = result.reshape(values.shape)
+    if isinstance(x, pd.DataFrame):
+        return pd.DataFrame(result, index=x.index, columns=x.columns)
+    if isinstance(x, pd.Series):
+        return pd.Series(result, index=x.index, name=x.name)
+    return result
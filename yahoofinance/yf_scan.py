@@ -0,0 +1,263 @@
+"""
+yf_scan.py
+    Contains scanner, which screens a large universe of symbols for
+    setups by splitting it into shards, each fetched and analysed with
+    price_data in its own process, and returning only the symbols whose
+    latest bar meets every condition.
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from yf_fetcher import yf_fetcher
+from yf_price import price_data
+
+
+class above:
+    """
+    Condition that column a is above column (or value) b on the last bar.
+    """
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+
+
+    def _value(self, df, x):
+        return df[x].iloc[-1] if isinstance(x, str) else x
+
+
+    def __call__(self, df):
+        return self._value(df, self.a) > self._value(df, self.b)
+
+
+class below(above):
+    """
+    Condition that column a is below column (or value) b on the last bar.
+    """
+    def __call__(self, df):
+        return self._value(df, self.a) < self._value(df, self.b)
+
+
+class crossed_above:
+    """
+    Condition that column a crossed above column b within the last bars,
+    e.g., crossed_above('MACD', 'MACD_EMA9') for a bullish MACD crossing.
+    """
+    def __init__(self, a, b, bars=1):
+        self.a, self.b, self.bars = a, b, bars
+
+
+    def _spread(self, df):
+        return (df[self.a]-df[self.b]).iloc[-self.bars-1:]
+
+
+    def __call__(self, df):
+        spread = self._spread(df)
+        return bool(len(spread) > 1 and spread.iloc[0] <= 0 and
+                    spread.iloc[-1] > 0)
+
+
+class crossed_below(crossed_above):
+    """
+    Condition that column a crossed below column b within the last bars.
+    """
+    def __call__(self, df):
+        spread = self._spread(df)
+        return bool(len(spread) > 1 and spread.iloc[0] >= 0 and
+                    spread.iloc[-1] < 0)
+
+
+class rising:
+    """
+    Condition that column a rose over the last bars, e.g., an OBV trend.
+    """
+    def __init__(self, a, bars=5):
+        self.a, self.bars = a, bars
+
+
+    def __call__(self, df):
+        x = df[self.a].iloc[-self.bars-1:]
+        return bool(len(x) > 1 and x.iloc[-1] > x.iloc[0])
+
+
+class falling(rising):
+    """
+    Condition that column a fell over the last bars.
+    """
+    def __call__(self, df):
+        x = df[self.a].iloc[-self.bars-1:]
+        return bool(len(x) > 1 and x.iloc[-1] < x.iloc[0])
+
+
+_pivot_levels = ['pivot', 'S1', 'S2', 'S3', 'R1', 'R2', 'R3']
+
+
+def _with_pivots(df, pivots):
+    """
+    Returns:
+        df with the pivot levels in effect at each bar added as columns
+    """
+    pivots = pivots.dropna(subset=['start']).sort_values('start')
+    times = lambda x: pd.DatetimeIndex(x).as_unit('ns').asi8
+    t = times(df.index)
+    levels = np.full((len(df), len(_pivot_levels)), np.nan)
+    if len(pivots):
+        # Latest pivot started at or before each bar, if not yet ended
+        i = np.searchsorted(times(pivots['start']), t, side='right')-1
+        active = (i >= 0) & (t < times(pivots['end'])[i.clip(0)])
+        values = pivots[_pivot_levels].to_numpy(dtype=np.float64)
+        levels[active] = values[i[active]]
+    df = df.drop(columns=_pivot_levels, errors='ignore')
+    return df.join(pd.DataFrame(levels, index=df.index,
+                                columns=_pivot_levels))
+
+
+def _scan_shard(symbols, period1, period2, interval, indicators, conditions,
+                price_kwargs, fetcher_kwargs):
+    """
+    Description:
+        Scans one shard of symbols, run in a worker process.
+
+    Returns:
+        tuple of dict of matching symbols' last bars (with a column per
+        condition), dict of failed symbols' reasons, and the fetcher's
+        yf_stats (None if not recording)
+    """
+    fetcher = yf_fetcher(**fetcher_kwargs)
+    prices = price_data(symbols, period1, period2, interval, fetcher=fetcher,
+                        **price_kwargs)
+    failed = dict(fetcher.failed)
+    for name, args, kwargs in indicators:
+        getattr(prices, name)(*args, **kwargs)
+    pivots = {}
+    if prices.pivot_data is not None:
+        pivots = dict(prices._frames(prices.pivot_data))
+    matches = {}
+    for sym, df in prices._frames(prices.data):
+        if not len(df):
+            failed[sym] = 'no bars'
+            continue
+        try:
+            if sym in pivots:
+                df = _with_pivots(df, pivots[sym])
+            passed = {name: bool(condition(df))
+                      for name, condition in conditions.items()}
+        except Exception as err:
+            failed[sym] = repr(err)
+            continue
+        if all(passed.values()):
+            matches[sym] = pd.concat([df.iloc[-1], pd.Series(passed)])
+    return matches, failed, fetcher.stats
+
+
+class scanner:
+    """
+    Scanner
+        Screens symbols for setups across a process pool. Each shard of
+        symbols is fetched into a price_data, the declared indicators are
+        calculated, and every condition is evaluated on each symbol's
+        dataframe. Pivot levels (pivot, S1-S3, R1-R3) in effect at each
+        bar are joined to the dataframe if pivot_points is declared.
+
+    Example:
+        scan = scanner(period1, period2, '1d',
+                       indicators=[('MACD', (), {}),
+                                   ('pivot_points', (), {})],
+                       conditions={'macd': crossed_above('MACD', 'MACD_EMA9'),
+                                   'r1': above('close', 'R1')})
+        matches = scan.scan(symbols)
+    """
+
+    def __init__(self, period1, period2, interval, indicators=(),
+                 conditions=None, processes=None, shard_size=50,
+                 price_kwargs=None, fetcher_kwargs=None):
+        """
+        Arguments:
+            period1: first date to fetch prices
+            period2: last date to fetch prices
+            interval: one of YF's data intervals, e.g., '1d'
+
+        Keyword arguments:
+            indicators: list of (price_data method, args, kwargs) tuples,
+                        calculated in order, e.g., ('MA', (20,), {})
+            conditions: dict of picklable functions of a symbol's
+                        dataframe returning whether its setup is met,
+                        e.g., the above, below, crossed_above,
+                        crossed_below, rising, and falling classes
+            processes: worker processes (default: os.cpu_count(), 1 scans
+                       in this process)
+            shard_size: symbols per shard, i.e., per price_data
+            price_kwargs: keyword arguments of each shard's price_data,
+                          e.g., {'panel': True}
+            fetcher_kwargs: keyword arguments of each worker's yf_fetcher,
+                            e.g., {'workers': 8, 'cache': bar_store(path)}
+                            so workers share stored bars through the
+                            page cache
+
+        Notes:
+            ^each worker process has its own fetcher, and a copy of the
+             cache, limiter, and stats of fetcher_kwargs
+            ^a limiter's copy limits a single process, so divide its rate
+             by processes, e.g., {'limiter': 5/processes}
+            ^stats the workers record are added to fetcher_kwargs' stats
+        """
+        self.period1 = period1
+        self.period2 = period2
+        self.interval = interval
+        self.indicators = list(indicators)
+        self.conditions = dict(conditions or {})
+        self.processes = processes or os.cpu_count()
+        self.shard_size = shard_size
+        self.price_kwargs = dict(price_kwargs or {})
+        self.fetcher_kwargs = dict(fetcher_kwargs or {})
+        self.failed = {}
+        return
+
+
+    def scan(self, symbols):
+        """
+        Arguments:
+            symbols: list of stock tickers screened
+
+        Notes:
+            ^symbols that fail to fetch or evaluate are recorded, with
+             the reason, in self.failed
+
+        Returns:
+            dataframe of the last bar of each matching symbol, with a
+            column per condition
+        """
+        shards = [symbols[i:i+self.shard_size]
+                  for i in range(0, len(symbols), self.shard_size)]
+        args = (self.period1, self.period2, self.interval, self.indicators,
+                self.conditions, self.price_kwargs, self.fetcher_kwargs)
+        # A shard that raises (e.g., in an indicator) fails its symbols,
+        # in this process or a worker alike
+        failed = lambda shard, err: ({}, {sym: repr(err) for sym in shard},
+                                     None)
+        results = []
+        if self.processes <= 1:
+            for shard in shards:
+                try:
+                    results.append(_scan_shard(shard, *args))
+                except Exception as err:
+                    results.append(failed(shard, err))
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                futures = [pool.submit(_scan_shard, shard, *args)
+                           for shard in shards]
+                for shard, future in zip(shards, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as err:
+                        results.append(failed(shard, err))
+        self.failed = {}
+        matches = {}
+        stats = self.fetcher_kwargs.get('stats')
+        for m, f, worker_stats in results:
+            matches.update(m)
+            self.failed.update(f)
+            # Scans in this process record to stats itself
+            if stats is not None and worker_stats not in (None, stats):
+                stats.merge(worker_stats)
+        return pd.DataFrame.from_dict(matches, orient='index')
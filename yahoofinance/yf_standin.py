@@ -0,0 +1,335 @@
+"""
+yf_standin.py
+    Contains standin_server, a local stand-in for the Yahoo Finance API.
+    Serves synthetic (or recorded) /v8/finance/chart,
+    /v10/finance/quoteSummary, and /v7/finance/options payloads, so the
+    fetcher can be exercised and benchmarked offline by pointing
+    yf_fetcher's yahoo_url at it.
+"""
+import os
+import time
+import zlib
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+
+_seconds_in_interval = {'1m':60, '2m':120, '5m':300, '15m':900, '30m':1800,
+                        '60m':3600, '90m':5400, '1h':3600, '1d':86400,
+                        '5d':432000, '1wk':604800, '1mo':2592000,
+                        '3mo':7776000}
+_subday_intervals = ['1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h']
+
+
+def _dumps(obj):
+    body = json.dumps(obj)
+    return body if type(body) is bytes else body.encode()
+
+
+def _session_timestamps(period1, period2, interval,
+                        timezone='America/New_York'):
+    """
+    Returns:
+        array of times (seconds since epoch) of bars of a day or longer
+        overlapping period1 to period2, stamped at 9:30 exchange time of
+        their first day like YF's; weeks start on Mondays
+    """
+    days = _seconds_in_interval[interval]//86400
+    first = pd.Timestamp(period1, unit='s', tz='UTC').tz_convert(
+        timezone).tz_localize(None).normalize()
+    if interval == '1wk':
+        first -= pd.Timedelta(first.weekday(), unit='D')
+    n = (period2-period1)//(days*86400)+3
+    starts = first+pd.to_timedelta(np.arange(n)*days, unit='D')
+    opens = (starts+pd.Timedelta(9.5, unit='h')).tz_localize(timezone)
+    start = starts.tz_localize(timezone, nonexistent='shift_forward')
+    epoch = lambda x: np.asarray((x-pd.Timestamp(0, tz='UTC'))
+                                 // pd.Timedelta(1, unit='s'))
+    return epoch(opens)[epoch(start) < period2]
+
+
+def chart_payload(symbol, period1, period2, interval, null_fraction=0.01):
+    """
+    Description:
+        Synthetic chart payload of a random walk, seeded by the symbol
+        so repeated requests return the same bars.
+
+    Arguments:
+        symbol: stock ticker
+        period1: first time of bars (seconds since epoch)
+        period2: last time of bars (seconds since epoch)
+        interval: one of YF's data intervals, e.g., '1d'
+
+    Keyword arguments:
+        null_fraction: fraction of bars returned as nulls, like YF's gaps
+
+    Returns:
+        bytes of JSON chart payload
+    """
+    step = _seconds_in_interval[interval]
+    if interval in _subday_intervals:
+        timestamp = np.arange(period1-period1 % step, period2, step)
+    else:
+        timestamp = _session_timestamps(period1, period2, interval)
+    n = len(timestamp)
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    close = 100*np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    open_ = close*np.exp(rng.normal(0, 5e-4, n))
+    high = np.maximum(open_, close)*(1+rng.uniform(0, 1e-3, n))
+    low = np.minimum(open_, close)*(1-rng.uniform(0, 1e-3, n))
+    volume = rng.integers(100, 100000, n)
+    quote = {'open': open_.tolist(), 'close': close.tolist(),
+             'low': low.tolist(), 'high': high.tolist(),
+             'volume': volume.tolist()}
+    for i in np.flatnonzero(rng.random(n) < null_fraction):
+        for column in quote.values():
+            column[i] = None
+    indicators = {'quote': [quote]}
+    if interval not in _subday_intervals:
+        indicators['adjclose'] = [{'adjclose': quote['close']}]
+    meta = {'currency': 'USD', 'symbol': symbol,
+            'exchangeName': 'NMS', 'instrumentType': 'EQUITY',
+            'exchangeTimezoneName': 'America/New_York',
+            'dataGranularity': interval,
+            'currentTradingPeriod': {
+                'regular': {'timezone': 'EST', 'gmtoffset': -18000,
+                            'start': 1609857000, 'end': 1609880400}}}
+    return _dumps({'chart': {'result': [{'meta': meta,
+                                         'timestamp': timestamp.tolist(),
+                                         'indicators': indicators}],
+                             'error': None}})
+
+
+def options_payload(symbol, date=None, expirations=12, strikes=41):
+    """
+    Description:
+        Synthetic options payload of weekly expirations (Fridays from
+        2024-01-05) with strikes around a price seeded by the symbol.
+
+    Arguments:
+        symbol: stock ticker
+
+    Keyword arguments:
+        date: expiration of chain returned (seconds since epoch), the
+              nearest if None; unlisted dates return no chain
+        expirations: number of expirations listed
+        strikes: number of strikes of each expiration
+
+    Returns:
+        bytes of JSON options payload
+    """
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    price = round(100*float(np.exp(rng.normal(0, 0.5))), 2)
+    listed = [1704412800+i*7*86400 for i in range(expirations)]
+    strike = np.round(price*np.linspace(0.6, 1.4, strikes)*2)/2
+    date = listed[0] if date is None else date
+    options = []
+    if date in listed:
+        rng = np.random.default_rng(zlib.crc32('{:s}{:d}'.format(
+            symbol, date).encode()))
+        t = (listed.index(date)+1)*7/365
+        moneyness = np.log(strike/price)
+        iv = 0.25+0.5*moneyness**2+rng.uniform(0, 0.02, strikes)
+        # Rough time value, only shapes have to look like options
+        value = price*iv*np.sqrt(t)*0.4*np.exp(-moneyness**2/(2*iv**2*t))
+        chain = {'expirationDate': date, 'hasMiniOptions': False}
+        day = time.strftime('%y%m%d', time.gmtime(date))
+        for kind, intrinsic in [('C', np.maximum(price-strike, 0)),
+                                ('P', np.maximum(strike-price, 0))]:
+            mid = intrinsic+value
+            spread = np.maximum(0.01, mid*rng.uniform(0.01, 0.05, strikes))
+            # Python floats, JSON encoders don't take numpy scalars
+            bid = np.round(np.maximum(0, mid-spread/2), 2).tolist()
+            ask = np.round(mid+spread/2, 2).tolist()
+            last = np.round(mid, 2).tolist()
+            contracts = []
+            for i, k in enumerate(strike.tolist()):
+                contract = {
+                    'contractSymbol': '{:s}{:s}{:s}{:08d}'.format(
+                        symbol, day, kind, int(k*1000)),
+                    'strike': k, 'currency': 'USD', 'lastPrice': last[i],
+                    'bid': bid[i], 'ask': ask[i],
+                    'openInterest': int(rng.integers(0, 5000)),
+                    'contractSize': 'REGULAR', 'expiration': date,
+                    'impliedVolatility': float(iv[i]),
+                    'inTheMoney': bool(intrinsic[i] > 0)}
+                # Like YF, contracts that didn't trade have no volume
+                if rng.random() < 0.8:
+                    contract['volume'] = int(rng.integers(1, 1000))
+                contracts.append(contract)
+            chain['calls' if kind == 'C' else 'puts'] = contracts
+        options.append(chain)
+    result = {'underlyingSymbol': symbol, 'expirationDates': listed,
+              'strikes': strike.tolist(), 'hasMiniOptions': False,
+              'quote': {'symbol': symbol, 'regularMarketPrice': price},
+              'options': options}
+    return _dumps({'optionChain': {'result': [result], 'error': None}})
+
+
+def quote_summary_payload(symbol, modules):
+    """
+    Returns:
+        bytes of JSON quoteSummary payload with placeholder modules
+    """
+    result = {module: {'maxAge': 1, 'symbol': symbol} for module in modules}
+    return _dumps({'quoteSummary': {'result': [result], 'error': None}})
+
+
+class _handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        return
+
+
+    def _send(self, status, body, headers={}):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        endpoint, symbol = url.path.rsplit('/', 1)
+        with server.lock:
+            server.requests += 1
+        if server.throttle():
+            self._send(429, _dumps({'error': 'too many requests'}),
+                       {'Retry-After': '1'})
+            return
+        recorded = server.recorded(endpoint, symbol)
+        if recorded is not None:
+            body = recorded
+        elif endpoint == '/v8/finance/chart':
+            body = server.cache.get(self.path)
+            if body is None:
+                body = chart_payload(symbol, int(query['period1']),
+                                     int(query['period2']),
+                                     query['interval'], server.null_fraction)
+                with server.lock:
+                    if server.cache_bytes+len(body) <= server.max_cache_bytes:
+                        server.cache[self.path] = body
+                        server.cache_bytes += len(body)
+        elif endpoint == '/v7/finance/options':
+            date = int(query['date']) if 'date' in query else None
+            body = options_payload(symbol, date)
+        elif endpoint == '/v10/finance/quoteSummary':
+            modules = [m for m in query.get('modules', '').split(',') if m]
+            body = quote_summary_payload(symbol, modules)
+        else:
+            self._send(404, _dumps({'error': 'unknown endpoint'}))
+            return
+        with server.lock:
+            server.bytes_sent += len(body)
+        self._send(200, body)
+        return
+
+
+class standin_server(ThreadingHTTPServer):
+    """
+    Stand-in Server
+        Local HTTP server mimicking the Yahoo Finance endpoints, runs on a
+        background thread.
+
+    Example:
+        with standin_server() as server:
+            fetcher = yf_fetcher(yahoo_url=server.url)
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, replay=None,
+                 null_fraction=0.01, max_cache_bytes=2**30, rate_limit=None):
+        """
+        Keyword arguments:
+            host: address served on (default: 127.0.0.1)
+            port: port served on (default: any free port)
+            replay: directory of recorded payloads, served in place of
+                    synthetic ones as replay/chart/SYMBOL.json and
+                    replay/quoteSummary/SYMBOL.json
+            null_fraction: fraction of synthetic bars returned as nulls
+            max_cache_bytes: bytes of generated chart payloads kept to
+                             serve repeated requests (default: 1 GiB)
+            rate_limit: requests per second served before answering 429
+                        with a Retry-After, like YF's throttling
+                        (default: None, unlimited)
+        """
+        super().__init__((host, port), _handler)
+        self.replay = replay
+        self.null_fraction = null_fraction
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.cache = {}
+        self.cache_bytes = 0
+        self.max_cache_bytes = max_cache_bytes
+        self.rate_limit = rate_limit
+        self.throttled = 0
+        self._served = deque()
+        self.url = 'http://{:s}:{:d}'.format(*self.server_address[:2])
+        self._thread = None
+        return
+
+
+    def throttle(self):
+        """
+        Returns:
+            whether a request exceeds rate_limit over the last second
+        """
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self._served and now-self._served[0] >= 1:
+                self._served.popleft()
+            if len(self._served) >= self.rate_limit:
+                self.throttled += 1
+                return True
+            self._served.append(now)
+        return False
+
+
+    def recorded(self, endpoint, symbol):
+        if self.replay is None:
+            return None
+        fname = os.path.join(self.replay, endpoint.rsplit('/', 1)[-1],
+                             symbol+'.json')
+        if not os.path.isfile(fname):
+            return None
+        with open(fname, 'rb') as file:
+            return file.read()
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        return
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *args):
+        self.stop()
+        return
@@ -0,0 +1,136 @@
+"""
+yf_stats.py
+    Contains yf_stats, an opt-in record of the time spent in each stage
+    of the fetch and analysis pipeline (HTTP, JSON decode, timestamp
+    conversion, dataframe construction, indicators) and of counters such
+    as requests, retries, bytes received (and decoded, body_bytes), and
+    cache hits.
+"""
+import time
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+class yf_stats:
+    """
+    Yahoo Finance Statistics
+        Thread-safe accumulator of stage durations and counters. Pass one
+        to yf_fetcher(stats=...), price_data uses its fetcher's stats.
+
+    Example:
+        stats = yf_stats()
+        fetcher = yf_fetcher(stats=stats)
+        ...
+        print(stats.summary())
+    """
+
+    def __init__(self, callback=None):
+        """
+        Keyword arguments:
+            callback: function called as callback(kind, name, value) on
+                      every record, where kind is 'stage' (value in
+                      seconds) or 'count'
+        """
+        self.callback = callback
+        self._lock = threading.Lock()
+        self.reset()
+        return
+
+
+    def __getstate__(self):
+        # Locks can't be pickled, e.g., to pass stats to worker processes
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        return
+
+
+    def reset(self):
+        with self._lock:
+            self.seconds = defaultdict(float)
+            self.calls = defaultdict(int)
+            self.counters = defaultdict(int)
+        return
+
+
+    def record(self, name, seconds):
+        """
+        Description:
+            Adds a duration to a stage.
+        """
+        with self._lock:
+            self.seconds[name] += seconds
+            self.calls[name] += 1
+        if self.callback is not None:
+            self.callback('stage', name, seconds)
+        return
+
+
+    def count(self, name, n=1):
+        """
+        Description:
+            Increments a counter, e.g., requests or bytes.
+        """
+        with self._lock:
+            self.counters[name] += n
+        if self.callback is not None:
+            self.callback('count', name, n)
+        return
+
+
+    def merge(self, other):
+        """
+        Description:
+            Adds the stages and counters of other, e.g., the copy a worker
+            process recorded to.
+        """
+        with self._lock:
+            for name, seconds in other.seconds.items():
+                self.seconds[name] += seconds
+            for name, calls in other.calls.items():
+                self.calls[name] += calls
+            for name, n in other.counters.items():
+                self.counters[name] += n
+        return
+
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Description:
+            Context manager recording the time spent within as a stage.
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter()-t0)
+
+
+    def summary(self):
+        """
+        Returns:
+            dataframe of calls, total and mean seconds of each stage
+        """
+        with self._lock:
+            df = pd.DataFrame({'calls': pd.Series(self.calls, dtype=int),
+                               'seconds': pd.Series(self.seconds,
+                                                    dtype=float)})
+        df['mean'] = df['seconds']/df['calls']
+        return df.sort_values('seconds', ascending=False)
+
+
+    def counts(self):
+        """
+        Returns:
+            series of counters
+        """
+        with self._lock:
+            return pd.Series(self.counters, dtype=int).sort_index()
@@ -0,0 +1,174 @@
+"""
+yf_store.py
+    Contains bar_store, a columnar on-disk store of price history: one
+    array file per field of each symbol and a timestamp index, memory
+    mapped so price frames are sliced by time without reading (or
+    copying) the rest of the history, and processes share it through the
+    page cache.
+"""
+import os
+import time
+import pickle
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+
+from utils import *
+from yf_cache import price_cache
+
+
+class bar_store(price_cache):
+    """
+    Bar Store
+        Stores bars per (symbol, interval, PrePost, events) key as a
+        directory of .npy files, index.npy of seconds since epoch and a
+        file per field (e.g., close.npy), along with the time ranges
+        those bars cover. Drop-in for price_cache, only fetching the time
+        ranges missing from the store.
+
+    Example:
+        store = bar_store('~/bars')
+        prices = price_data(symbols, period1, period2, '1m',
+                            fetcher=yf_fetcher(cache=store))
+
+    Notes:
+        ^frames returned are read-only views of the memory-mapped files,
+         new columns (e.g., indicators) can be added, but values can't be
+         assigned in place
+        ^updates write a new version of the files and then switch to it,
+         so readers (other processes included) never see partial files
+    """
+
+    def __init__(self, path=None):
+        """
+        Keyword arguments:
+            path: directory of store (default: ~/.cache/yahoofinance/bars)
+        """
+        if path is None:
+            path = os.path.join('~', '.cache', 'yahoofinance', 'bars')
+        super().__init__(path)
+        return
+
+
+    def _file(self, key):
+        # Directory of key, named like price_cache's file
+        return super()._file(key)[:-len('.pkl')]
+
+
+    def load(self, key):
+        """
+        Returns:
+            dict of meta, coverage, memory-mapped index (time) and field
+            arrays (arrays) for key (None if not stored)
+        """
+        directory = self._file(key)
+        # A writer may remove the version just read, so read the entry again
+        for attempt in range(3):
+            try:
+                with open(os.path.join(directory, 'entry.pkl'),
+                          'rb') as file:
+                    entry = pickle.load(file)
+                version = os.path.join(directory, entry['version'])
+                mmap = lambda name: np.load(
+                    os.path.join(version, name+'.npy'), mmap_mode='r')
+                entry['time'] = mmap('index')
+                entry['arrays'] = {c: mmap(c) for c in entry['columns']}
+                return entry
+            except FileNotFoundError:
+                continue
+            except (EOFError, pickle.UnpicklingError):
+                return None
+        return None
+
+
+    def save(self, key, entry):
+        """
+        Description:
+            Writes entry's data as a new version of key's files, then
+            maps them in place of entry's data.
+        """
+        directory = self._file(key)
+        data = entry.pop('data')
+        meta = entry['meta']
+        version = '{:d}.{:d}.{:d}'.format(time.time_ns(), os.getpid(),
+                                          threading.get_ident())
+        os.makedirs(os.path.join(directory, version))
+        save = lambda name, x: np.save(
+            os.path.join(directory, version, name+'.npy'),
+            np.ascontiguousarray(x))
+        save('index', DTI_to_UT(data.index,
+                                timezone=meta['exchangeTimezoneName']))
+        for c in data.columns:
+            save(c, data[c].to_numpy())
+        header = {'meta': meta, 'coverage': entry['coverage'],
+                  'columns': list(data.columns), 'version': version}
+        fname = os.path.join(directory, 'entry.pkl')
+        previous = None
+        try:
+            with open(fname, 'rb') as file:
+                previous = pickle.load(file)['version']
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+        tmp = '{:s}.{:s}.tmp'.format(fname, version)
+        with open(tmp, 'wb') as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)
+        # Keep the previous version for readers that just loaded it, open
+        # maps of older ones outlive their files
+        for name in os.listdir(directory):
+            if (name not in (version, previous) and
+                os.path.isdir(os.path.join(directory, name))):
+                shutil.rmtree(os.path.join(directory, name),
+                              ignore_errors=True)
+        entry.update(self.load(key) or {})
+        return
+
+
+    def clear(self, symbol=None):
+        """
+        Description:
+            Removes stored bars of a symbol, or all stored bars.
+        """
+        for name in os.listdir(self.path):
+            if symbol is None or name.startswith(symbol+'_'):
+                shutil.rmtree(os.path.join(self.path, name),
+                              ignore_errors=True)
+        return
+
+
+    def _frame(self, entry, i=0, j=None, index_tz='UTC'):
+        """
+        Returns:
+            dataframe of entry's bars i to j, viewing the mapped arrays,
+            indexed in index_tz (see yf_fetcher)
+        """
+        index = UT_to_DTI(entry['time'][i:j],
+                          timezone=entry['meta']['exchangeTimezoneName'],
+                          tz=index_tz)
+        # Plain ndarray views of the maps, pandas needn't see memmaps
+        columns = {c: x[i:j].view(np.ndarray)
+                   for c, x in entry['arrays'].items()}
+        return pd.DataFrame(columns, index=index, copy=False)
+
+
+    def _data(self, entry):
+        if 'time' not in entry:
+            return None
+        return self._frame(entry)
+
+
+    def _slice(self, fetcher, entry, period1, period2, interval):
+        if 'time' not in entry:
+            return None, None
+        i, j = np.searchsorted(entry['time'], [period1, period2])
+        # Only the bar before period1 can still be open at period1
+        if i > 0:
+            start = UT_to_DTI(entry['time'][i-1:i], tz='UTC')
+            seconds = fetcher._seconds_in_interval[interval]
+            if self._ends(start, entry['meta'], seconds)[0] > period1:
+                i -= 1
+        # Cast only copies if the fetcher's dtypes differ from the stored
+        return entry['meta'], fetcher._cast(
+            self._frame(entry, i, j, fetcher.index_tz))
+
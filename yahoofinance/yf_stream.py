@@ -0,0 +1,245 @@
+"""
+yf_stream.py
+    Contains price_stream, which keeps the state of price_data indicators
+    per symbol so that new bars update the indicators in constant time,
+    rather than recalculating them over the whole price history.
+"""
+import numpy as np
+import pandas as pd
+from collections import deque
+
+
+class _EMA_state:
+    """
+    Exponential moving average matching pandas ewm(span).mean(), i.e.,
+    the adjusted average num/den of exponentially decaying weights.
+    """
+    def __init__(self, span, x):
+        self.decay = 1-2/(span+1)
+        x = x.dropna()
+        # Recover weighted sum from last batch average and sum of weights
+        self.den = (1-self.decay**len(x))/(1-self.decay)
+        self.num = x.ewm(span=span).mean().iloc[-1]*self.den if len(x) else 0.
+        return
+
+
+    def update(self, x):
+        self.num = x+self.decay*self.num
+        self.den = 1+self.decay*self.den
+        return self.num/self.den
+
+
+class _MA_state:
+    """
+    Moving average matching pandas rolling(window, win_type).mean().
+    """
+    def __init__(self, window, x, win_type=None, **win_kwargs):
+        self.window = window
+        self.buffer = deque(np.asarray(x, dtype=float)[-window:],
+                            maxlen=window)
+        self.sum = sum(self.buffer)
+        self.count = 0
+        self.weights = None
+        if win_type is not None:
+            from scipy.signal import windows
+            self.weights = getattr(windows, win_type)(window, **win_kwargs)
+        return
+
+
+    def update(self, x):
+        if len(self.buffer) == self.window:
+            self.sum -= self.buffer[0]
+        self.buffer.append(x)
+        self.sum += x
+        # Resum buffer every window updates so rounding errors can't grow
+        self.count += 1
+        if self.count == self.window:
+            self.sum, self.count = sum(self.buffer), 0
+        if len(self.buffer) < self.window:
+            return np.nan
+        if self.weights is None:
+            return self.sum/self.window
+        return np.dot(self.weights, self.buffer)/self.weights.sum()
+
+
+class _OBV_state:
+    """
+    Running On-Balance Volume total, matching price_data.OBV when not
+    normalized.
+    """
+    def __init__(self, close, obv):
+        self.close = close.iloc[-1] if len(close) else np.nan
+        self.total = obv.iloc[-1] if len(obv) else 0.
+        return
+
+
+    def update(self, close, volume):
+        if close > self.close:
+            self.total += volume
+        elif close < self.close:
+            self.total -= volume
+        self.close = close
+        return self.total
+
+
+class price_stream:
+    """
+    Price Stream
+        Incremental indicators of a price_data object. Each declared
+        indicator is first calculated over the existing history with
+        price_data's batch method, and then updated bar by bar in O(1)
+        (O(window) for weighted moving averages) as new bars arrive.
+    """
+
+    def __init__(self, prices, append=True):
+        """
+        Arguments:
+            prices: price_data object streamed to
+
+        Keyword arguments:
+            append: append new bars and indicators to prices.data (boolean)
+
+        Notes:
+            ^appending to a pandas dataframe copies it, so for monitoring
+             only the latest values set append to False and use the frames
+             returned by update
+        """
+        self.prices = prices
+        self.append = append
+        self.indicators = []
+        self.state = {sym: {} for sym, df in prices._frames(prices.data)}
+        return
+
+
+    def _history(self, sym):
+        prices = self.prices
+        if not prices.multiple:
+            return prices.data
+        return prices.data[sym].dropna(how='all')
+
+
+    def _declare(self, name, var, column=None):
+        # Redeclaring an indicator replaces it, as the batch methods do
+        self.indicators = [i for i in self.indicators if i[0] != name]
+        self.indicators.append((name, var, column))
+        return
+
+
+    def MA(self, window, var='close', win_type=None, **win_kwargs):
+        """
+        Description:
+            Streams Moving Average (MA), see price_data.MA.
+        """
+        self.prices.MA(window, var=var, win_type=win_type, **win_kwargs)
+        for sym in self.state:
+            self.state[sym]['MA'] = _MA_state(window,
+                                              self._history(sym)[var],
+                                              win_type=win_type, **win_kwargs)
+        self._declare('MA', var, self.prices._column('MA', window, var,
+                                                     win_type=win_type))
+        return
+
+
+    def EMA(self, span, var='close'):
+        """
+        Description:
+            Streams Exponential Moving Average (EMA), see price_data.EMA.
+        """
+        self.prices.EMA(span, var=var)
+        for sym in self.state:
+            self.state[sym]['EMA'] = _EMA_state(span, self._history(sym)[var])
+        self._declare('EMA', var, self.prices._column('EMA', span, var))
+        return
+
+
+    def MACD(self, short_span=12, long_span=26, signal_span=9):
+        """
+        Description:
+            Streams Moving Average Convergence/Divergence (MACD), see
+            price_data.MACD. The MACD-signal is not normalized.
+        """
+        self.prices.MACD(short_span=short_span, long_span=long_span,
+                         signal_span=signal_span, normalize=False)
+        signal = 'MACD_EMA'+str(signal_span)
+        for sym in self.state:
+            df = self._history(sym)
+            self.state[sym]['MACD'] = (
+                _EMA_state(short_span, df['close']),
+                _EMA_state(long_span, df['close']),
+                _EMA_state(signal_span, df['MACD'])
+            )
+        self._declare('MACD', signal)
+        return
+
+
+    def OBV(self):
+        """
+        Description:
+            Streams On-Balance Volume (OBV), see price_data.OBV. The OBV
+            is not normalized.
+        """
+        self.prices.OBV(normalize=False)
+        for sym in self.state:
+            df = self._history(sym)
+            self.state[sym]['OBV'] = _OBV_state(df['close'], df['OBV'])
+        self._declare('OBV', None)
+        return
+
+
+    def _update(self, sym, bars):
+        """
+        Returns:
+            bars with streamed indicator columns added
+        """
+        state = self.state.setdefault(sym, {})
+        bars = bars.copy()
+        for name, var, column in self.indicators:
+            if name not in state:
+                raise KeyError('{:s} has no {:s} history to stream from'
+                               .format(sym, name))
+            if name == 'MACD':
+                short, long, signal = state[name]
+                macd = np.array([short.update(x)-long.update(x)
+                                 for x in bars['close']])
+                ema = np.array([signal.update(x) for x in macd])
+                bars['MACD'] = macd
+                bars[var] = ema
+                bars['MACD_sig'] = macd-ema
+            elif name == 'OBV':
+                bars['OBV'] = [state[name].update(c, v) for c, v in
+                               zip(bars['close'], bars['volume'])]
+            else:
+                bars[name] = [state[name].update(x) for x in bars[var]]
+                bars[column] = bars[name]
+        return self.prices._cast(bars)
+
+
+    def update(self, bars):
+        """
+        Description:
+            Updates the streamed indicators with new bars.
+
+        Arguments:
+            bars: dataframe of new bars, or for multiple securities a dict
+                  of dataframes keyed by symbol
+
+        Returns:
+            new bars with indicator columns (dataframe, or dict of them)
+        """
+        prices = self.prices
+        if not prices.multiple:
+            new = self._update(prices.symbols, bars)
+            if self.append:
+                prices.data = pd.concat([prices.data, new])
+                prices.clear_cache()
+            return new
+        new = {sym: self._update(sym, df) for sym, df in bars.items()}
+        if self.append:
+            if prices.panel:
+                prices.data = pd.concat([prices.data, prices._to_panel(new)])
+                prices.data = prices.data.groupby(level=0).last()
+            else:
+                for sym, df in new.items():
+                    prices.data[sym] = pd.concat([prices.data[sym], df])
+            prices.clear_cache()
+        return new